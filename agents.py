@@ -6,7 +6,8 @@ from google.adk.plugins import LoggingPlugin
 from google.genai import types
 from dotenv import load_dotenv
 import os
-from tools import retrieve_products, parse_intent, return_order, check_order_status, get_my_orders, check_return_status, place_order_with_user, flag_return_for_review, get_user_return_history
+from tools import retrieve_products, parse_intent, get_product_id_by_name, run_in_thread
+from asynctools import return_order, check_order_status, get_my_orders, check_return_status, place_order_with_user, place_cart_order, flag_return_for_review, get_user_return_history
 
 load_dotenv()
 APP_NAME = os.getenv("APP_NAME")
@@ -26,8 +27,8 @@ product_agent = LlmAgent(
     instruction="""You are a product search specialist.
 
 Your goal is to help users find products.
-1.  Use the `retrieve_products` tool to search the catalog.
-2.  Unless the user asks for a specific number, **always show at least 15 products** if available.
+1.  Use the `retrieve_products` tool to search the catalog. It returns one page of the best matches (20 by default) plus `total_found`.
+2.  Unless the user asks for a specific number, **always show at least 15 products** if available. If the user wants to see more, call `retrieve_products` again with the same filters and the `next_cursor` from the previous result as `cursor`.
 3.  Present the results clearly to the user.
 4.  If no products are found, say so.
 5.  **IMPORTANT: Always display prices with "Rs." prefix. Use the price_formatted field from the tool output.**
@@ -36,8 +37,10 @@ Your goal is to help users find products.
 8.  **When you list products, format each product name as a Markdown link like this: `Product Name`.**
 8.  If the user asks why a product is a good pick or asks about its features, summarize the features from the tool output in a helpful way.
 9.  The search now uses fuzzy matching, so products will be found even if the search terms don't match exactly.
+10. For free-text requests that are not a clear category, brand or color (e.g. "noise cancelling", "galaxy watch"), pass the user's words as `query` instead of `name`; it tolerates partial and misspelt words and the other filters still apply.
+11. When the user describes a need or activity rather than naming products (e.g. "cushioned and breathable", "noise cancelling for the commute"), pass their words as `query` with `semantic=True` to match by meaning.
 """,
-    tools=[retrieve_products]
+    tools=[run_in_thread(retrieve_products)]
 )
 
 
@@ -71,6 +74,7 @@ When a user requests a return, follow these steps to validate it:
 
 **Tool Usage:**
 - To place an order: `place_order_with_user(product_name, quantity)`
+- To check out a cart of several products: `place_cart_order(items)` with items like `[{"product_name": "...", "quantity": 1}, ...]`. Use it once for the whole cart instead of one `place_order_with_user` call per item; it places all items or none.
 - To check order status: `check_order_status(order_id)`
 - To get order history: `get_my_orders(limit)`
 - For a valid return: `return_order(order_id, reason)`
@@ -85,6 +89,7 @@ When a user requests a return, follow these steps to validate it:
 """,
     tools=[
         place_order_with_user,
+        place_cart_order,
         return_order,
         check_order_status,
         get_my_orders,
@@ -111,11 +116,11 @@ orchestrator = LlmAgent(
     instruction="""You are the ShopGenie orchestrator.
 Your primary role is to understand the user's intent and delegate tasks to the appropriate specialist agent.
 Follow this workflow strictly:
-1.  **Parse Intent**: Always start by calling `parse_intent()` to understand the user's goal (e.g., searching for products, placing an order, checking status).
-2.  **Load Preferences**: Call `load_memory()` to retrieve any saved user preferences that might be relevant.
+1.  **Parse Intent and Load Preferences together**: Always start by calling `parse_intent()` (to understand the user's goal, e.g. searching for products, placing an order, checking status) and `load_memory()` (to retrieve saved user preferences) **in the same response**, as parallel function calls. They are independent; do not wait for one before calling the other.
+2.  **Product lookup for orders**: If the user says "order [product name]", also call `get_product_id_by_name(product_name)` in that same first response, alongside `parse_intent()` and `load_memory()`.
 3.  Use product_agent and service_agent based on the user's intent:
     *   **product_agent**: If the user wants to find, search for, or see products, use the subagent `product_agent`.
-    *   **service_agent**: If the user wants to place an order, check an order's status, get their order history, or process a return, delegate the task to subagent `service_agent`. If the user says "order [product name]", first use subagent `product_agent` to search for that product. Then, confirm with the user and use subagent `service_agent` to place the order using the product ID from the search results. Do not assume a product ID.
+    *   **service_agent**: If the user wants to place an order, check an order's status, get their order history, or process a return, delegate the task to subagent `service_agent`. For "order [product name]", confirm the product found by `get_product_id_by_name` with the user, then use subagent `service_agent` to place the order for it. If the lookup found nothing, use subagent `product_agent` to search for the product first. Do not assume a product ID.
 4.  User Context: The SubAgent `service_agent` automatically handles user identification from the session. You do not need to manage user IDs.
 5.  **Price Formatting**: Ensure all prices are displayed with "Rs." prefix in your responses.
 6.  Respond to User: Formulate a helpful, conversational response based on the results from the specialist agents. If an agent fails, do not just repeat the error. Try to understand the problem and find another way to help.
@@ -125,9 +130,11 @@ Follow this workflow strictly:
 - `service_agent`: Manages orders, returns, and status checks for the current user.
 - `parse_intent`: Extracts details like category, brand, and price from the user's query using fuzzy matching.
 - `load_memory`: Retrieves the user's saved preferences.
+- `get_product_id_by_name`: Finds the catalog product that best matches a product name.
 """,
     tools=[
-        parse_intent,
+        run_in_thread(parse_intent),
+        run_in_thread(get_product_id_by_name),
         AgentTool(agent=product_agent),
         AgentTool(agent=service_agent),
         load_memory
@@ -1,11 +1,11 @@
 import streamlit as st
 import asyncio
 import sys
-from utils import run_session
-from agents import shopApp
-from google.adk.runners import Runner
-from google.adk.sessions import DatabaseSessionService
-from google.adk.memory import InMemoryMemoryService
+import time
+from typing import Iterator, Optional
+from utils import stream_session, record_exchange
+import router
+from services import AgentServices
 from productstore import store
 from baseClass import Product
 from file_logger import log_trace
@@ -14,40 +14,37 @@ from file_logger import log_trace
 if sys.platform == "darwin":
     asyncio.set_event_loop_policy(asyncio.DefaultEventLoopPolicy())
 
-_loop = None
+@st.cache_resource
+def get_services() -> AgentServices:
+    """Created once per process; every session and rerun reuses the same runner and services."""
+    return AgentServices()
 
-def get_event_loop():
-    global _loop
-    try:
-        _loop = asyncio.get_event_loop()
-        if _loop.is_closed():
-            _loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(_loop)
-    except RuntimeError:
-        _loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(_loop)
-    return _loop
+def fast_path_response(services: AgentServices, userPrompt: str) -> Optional[str]:
+    """A templated answer for deterministic requests, recorded in the session; None means ask the LLM."""
+    answer = router.fast_answer(userPrompt)
+    if answer is not None:
+        services.run(record_exchange(services.runner, userPrompt, answer, session_name="user_id", session_service=services.session_service))
+    return answer
 
-def get_agent_response(userPrompt: str) -> str:
+def stream_agent_response(userPrompt: str) -> Iterator[str]:
+    """Yields the agent's reply in chunks as the model streams it."""
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        response = loop.run_until_complete(runner_creator(userPrompt))
-        return response
+        services = get_services()
+        answer = fast_path_response(services, userPrompt)
+        if answer is not None:
+            yield answer
+            return
+        yield from services.stream(
+            stream_session(services.runner, userPrompt, session_name="user_id", session_service=services.session_service)
+        )
     except Exception as e:
         import traceback
         st.error(f"Error: {str(e)}")
         st.error(traceback.format_exc())
-        return "Error occurred while getting response."
+        yield "Error occurred while getting response."
 
-async def runner_creator(userPrompt: str) -> str:
-    session_service = DatabaseSessionService("sqlite+aiosqlite:///shopgenie_sessions.db")
-    runner = Runner(
-        app=shopApp,
-        session_service=session_service,
-        memory_service=InMemoryMemoryService()
-    )
-    return await run_session(runner, user_queries=userPrompt, session_name="user_id", session_service=session_service)
+# Minimum seconds between chat redraws while a reply streams in
+STREAM_RENDER_INTERVAL = 0.05
 
 # def streamlit_starter():
 #     # Configure page
@@ -262,13 +259,24 @@ def streamlit_starter():
             st.session_state.messages.append({"role":"user","content":"Show my orders"})
             st.rerun()
         
-        # If the last message is from the user, get a response
+        # If the last message is from the user, stream the response into the chat as it arrives
         if st.session_state.messages[-1]["role"] == "user":
+            prompt = st.session_state.messages[-1]["content"]
+            reply = {"role": "assistant", "content": ""}
             with st.spinner("ShopGenie is thinking..."):
-                prompt = st.session_state.messages[-1]["content"]
-                resp = get_agent_response(prompt)
-                log_trace(session_id="user_id", prompt=prompt, response=resp)
-            st.session_state.messages.append({"role": "assistant", "content": resp})
+                chunks = stream_agent_response(prompt)
+                first = next(chunks, None)
+            st.session_state.messages.append(reply)
+            if first is not None:
+                reply["content"] = first
+                render_chat()
+                rendered_at = time.monotonic()
+                for chunk in chunks:
+                    reply["content"] += chunk
+                    if time.monotonic() - rendered_at >= STREAM_RENDER_INTERVAL:
+                        render_chat()
+                        rendered_at = time.monotonic()
+            log_trace(session_id="user_id", prompt=prompt, response=reply["content"])
             st.rerun()
 
         # Check if a product link was clicked
@@ -0,0 +1,97 @@
+"""
+Async versions of the order and return tools in tools.py, backed by AsyncSQLProductStore.
+
+They keep the names, signatures and result shapes of their sync counterparts, so agents see
+the same tool declarations; only the database round trips now await on the event loop. The
+responses are shaped by the same helpers in tools.py.
+"""
+import asyncio
+from typing import Dict, Any, List
+from productstore import async_store
+from tools import (
+    get_product_id_by_name, resolve_cart, tool_error, tool_result, order_preflight, order_data, cart_data,
+    orders_response, return_data, return_status_data, flag_data, return_history_data,
+)
+
+
+async def place_order_with_user(product_name: str, quantity: int = 1) -> Dict[str, Any]:
+    """Place an order for a product by name."""
+    user_id = "admin"  # Hardcoded user_id from session
+
+    try:
+        # The name lookup uses the catalog index, which is rebuilt from the database after a
+        # catalog write; run it on a worker thread so a rebuild never blocks the event loop
+        product_result = await asyncio.to_thread(get_product_id_by_name, product_name)
+        error = order_preflight(product_result, quantity)
+        if error:
+            return error
+        product_info = product_result["data"]
+
+        result = await async_store.place_order(user_id, product_info["product_id"], quantity)
+        return tool_result(result, lambda r: order_data(r, product_info["product_name"]))
+    except Exception as e:
+        return tool_error(e)
+
+async def place_cart_order(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Place orders for every item in a cart in one step, all or nothing.
+    items: list of {"product_name": str, "quantity": int} (quantity defaults to 1).
+    If any item can't be matched or filled, no order is placed.
+    """
+    user_id = "admin"  # Hardcoded user_id from session
+    try:
+        # Catalog index lookup (possibly a rebuild) on a worker thread, as above
+        cart = await asyncio.to_thread(resolve_cart, items)
+        if cart["status"] == "error":
+            return cart
+        return tool_result(await async_store.place_orders_bulk(user_id, cart["data"]["lines"]), cart_data)
+    except Exception as e:
+        return tool_error(e)
+
+async def return_order(order_id: int, reason: str = None) -> Dict[str, Any]:
+    """Request a return for an order."""
+    user_id = "admin"  # Hardcoded user_id
+    try:
+        return tool_result(await async_store.request_return(user_id, order_id, reason), return_data)
+    except Exception as e:
+        return tool_error(e)
+
+async def check_order_status(order_id: int) -> Dict[str, Any]:
+    """Check the status of a specific order."""
+    user_id = "admin"  # Hardcoded user_id
+    try:
+        return tool_result(await async_store.get_order(user_id, order_id), order_data)
+    except Exception as e:
+        return tool_error(e)
+
+async def get_my_orders(limit: int = 5) -> Dict[str, Any]:
+    """Get recent orders for the current user."""
+    user_id = "admin"  # Hardcoded user_id
+    try:
+        return orders_response(await async_store.get_user_orders(user_id, limit))
+    except Exception as e:
+        return tool_error(e)
+
+async def check_return_status(return_id: int) -> Dict[str, Any]:
+    """Check the status of a return request."""
+    user_id = "admin"  # Hardcoded user_id
+    try:
+        return tool_result(await async_store.get_return_status(user_id, return_id), return_status_data)
+    except Exception as e:
+        return tool_error(e)
+
+async def flag_return_for_review(order_id: int, reason: str) -> Dict[str, Any]:
+    """Flags a return request for manual review by a human agent."""
+    user_id = "admin"  # Hardcoded user_id
+    try:
+        return tool_result(await async_store.flag_suspicious_return(user_id, order_id, reason), flag_data)
+    except Exception as e:
+        return tool_error(e)
+
+async def get_user_return_history() -> Dict[str, Any]:
+    """Gets the number of returns previously initiated by the current user."""
+    user_id = "admin"  # Hardcoded user_id
+    try:
+        return tool_result(await async_store.get_user_return_count(user_id), return_history_data)
+    except Exception as e:
+        return tool_error(e)
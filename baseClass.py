@@ -1,6 +1,6 @@
-from sqlalchemy.orm import declarative_base, Mapped, mapped_column
-from sqlalchemy import Integer, String, Float
-from typing import Dict, Optional
+from sqlalchemy.orm import declarative_base, Mapped, mapped_column, deferred, relationship
+from sqlalchemy import Integer, String, Float, Index, ForeignKey
+from typing import Dict, List, Optional
 import json
 
 Base = declarative_base()
@@ -8,6 +8,10 @@ Base = declarative_base()
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_category_price", "category", "price"),
+        Index("ix_products_brand", "brand"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String, nullable=False)
@@ -18,13 +22,24 @@ class Product(Base):
     price: Mapped[float] = mapped_column(Float)
     color: Mapped[Optional[str]] = mapped_column(String)
 
-    features: Mapped[str] = mapped_column(String)  # Stored as JSON string
+    # JSON copy of the tags, written for older readers only; reads use feature_tags
+    features: Mapped[str] = deferred(mapped_column(String))
     rating: Mapped[float] = mapped_column(Float, default=0.0)
 
     stock: Mapped[int] = mapped_column(Integer, default=0)
 
     image: Mapped[Optional[str]] = mapped_column(String)
 
+    # Loaded for every product of a query in one extra SELECT ... WHERE product_id IN (...),
+    # so to_dict() over N products does not issue N lazy loads
+    feature_tags = relationship("ProductFeature", order_by="ProductFeature.position",
+                                cascade="all, delete-orphan", lazy="selectin")
+
+    def set_features(self, features: List[str]):
+        """Store features as product_features rows, keeping the JSON column in step."""
+        self.features = json.dumps(features)
+        self.feature_tags = [ProductFeature(position=i, tag=tag) for i, tag in enumerate(features)]
+
     def to_dict(self) -> Dict:
         return {
             "id": self.id,
@@ -33,16 +48,28 @@ class Product(Base):
             "brand": self.brand,
             "price": self.price,
             "color": self.color,
-            "features": json.loads(self.features),
+            "features": [f.tag for f in self.feature_tags],
             "rating": self.rating,
             "stock": self.stock,
             "image": self.image,
         }
 
+
+class ProductFeature(Base):
+    """One feature tag of a product; position keeps the product's own tag order."""
+    __tablename__ = "product_features"
+    # Feature filters: WHERE tag IN (...) reads the matching product ids from the index alone
+    __table_args__ = (
+        Index("ix_product_features_tag_product_id", "tag", "product_id"),
+    )
+
+    product_id: Mapped[int] = mapped_column(Integer, ForeignKey("products.id"), primary_key=True)
+    position: Mapped[int] = mapped_column(Integer, primary_key=True)
+    tag: Mapped[str] = mapped_column(String, nullable=False)
+
 import enum
 from datetime import datetime
-from sqlalchemy import ForeignKey, DateTime, Enum as SQLEnum
-from sqlalchemy.orm import relationship
+from sqlalchemy import DateTime, Enum as SQLEnum, text
 
 # Add these enums
 class OrderStatus(enum.Enum):
@@ -70,6 +97,10 @@ class User(Base):
 # Modify existing Order class
 class Order(Base):
     __tablename__ = "orders"
+    # Order history: WHERE user_id = ? ORDER BY order_id DESC LIMIT n reads the index in order
+    __table_args__ = (
+        Index("ix_orders_user_id_order_id", "user_id", text("order_id DESC")),
+    )
     
     order_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[str] = mapped_column(String(100), ForeignKey("users.user_id"), nullable=False)
@@ -100,6 +131,9 @@ class Order(Base):
 # Add new OrderReturn table
 class OrderReturn(Base):
     __tablename__ = "order_returns"
+    __table_args__ = (
+        Index("ix_order_returns_order_id", "order_id"),
+    )
     
     return_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     order_id: Mapped[int] = mapped_column(Integer, ForeignKey("orders.order_id"), nullable=False)
@@ -0,0 +1,856 @@
+"""
+Micro-benchmarks for the catalog and order paths.
+
+Run one suite at a time, e.g.:
+    python benchmarks.py scoring --sizes 10000 100000 1000000
+    python benchmarks.py concurrency --readers 8 --seconds 5
+    python benchmarks.py indexes --orders 200000
+    python benchmarks.py queries --limits 5 20 50
+    python benchmarks.py orders --threads 16 --stock 2000
+    python benchmarks.py cart --lines 1 5 20 50
+    python benchmarks.py features --sizes 10000 100000
+    python benchmarks.py serialize --sizes 10000 100000
+    python benchmarks.py pushdown --sizes 10000 100000
+    python benchmarks.py fts --sizes 10000 100000 1000000
+    python benchmarks.py semantic --sizes 10000 100000
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from typing import Dict, Any, List
+
+from sqlalchemy import text, select, func, insert, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, undefer
+
+from baseClass import Product, Order, OrderReturn, User, OrderStatus, ReturnStatus
+from productstore import SEED_PRODUCTS, SQLITE_ENGINE_PROFILE, SQLProductStore, AsyncSQLProductStore
+from productstore import FEATURE_ROWS, PRODUCT_ROWS, _feature_lists, _product_dicts
+from catalogindex import CatalogIndex
+from semanticindex import SemanticIndex, NPROBE
+
+NAME_SUFFIXES = ["pro", "max", "ultra", "lite", "air", "neo", "plus", "mini", "go", "x"]
+COLORS = ["black", "white", "blue", "red", "silver", "graphite", "gray", "aqua"]
+
+FUZZY_QUERIES = [
+    {"name": "nike"},
+    {"name": "revolution 6", "color": "black"},
+    {"name": "galaxy", "category": "smartphones", "brand": "samsung"},
+    {"category": "laptop", "brand": "del", "color": "blak"},
+]
+
+NAME_LOOKUPS = ["nike revolution", "samsung galaxy watch 5", "mx master", "airpods pro 2 neo 17"]
+
+SCORING_QUERIES = [
+    {"category": "running shoes", "max_price": 3000},
+    {"category": "laptops", "brand": "dell"},
+    {"color": "black", "features": ["lightweight"]},
+    {"max_price": 30000, "features": ["5g", "camera"]},
+    {"brand": "samsung"},
+]
+
+
+def synthetic_catalog(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """n product rows derived from the seed catalog, shaped like products table rows."""
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(1, n + 1):
+        base = rnd.choice(SEED_PRODUCTS)
+        rows.append({
+            "id": i,
+            "name": f"{base['name']} {rnd.choice(NAME_SUFFIXES)} {rnd.randint(1, 999)}",
+            "category": base["category"],
+            "brand": base["brand"],
+            "price": float(rnd.randint(500, 90000)),
+            "color": rnd.choice(COLORS),
+            "features": rnd.sample(base["features"], rnd.randint(0, len(base["features"]))),
+            "rating": round(rnd.uniform(1, 5), 1),
+            "stock": rnd.randint(0, 20),
+            "image": base["image"],
+        })
+    return rows
+
+
+def _timed(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _reference_search(rows, category=None, max_price=None, brand=None, color=None, features=None):
+    """The per-row filter/score/sort loop retrieve_products used before the vectorized path."""
+    from rapidfuzz import fuzz
+    features = features or []
+    products = rows
+    if max_price:
+        products = [p for p in products if p["price"] <= max_price]
+    for key, query in (("category", category), ("brand", brand), ("color", color)):
+        if query:
+            q = query.lower()
+            filtered = []
+            for p in products:
+                similarity = fuzz.ratio(q, p[key].lower())
+                if similarity >= 70:
+                    p = dict(p)
+                    p[f"_{key}_similarity"] = similarity
+                    filtered.append(p)
+            products = filtered
+    if features:
+        products = [p for p in products if any(f in p["features"] for f in features)]
+    scored = []
+    for p in products:
+        score = p["rating"] * 20
+        score += p.get("_name_similarity", 0) * 0.5
+        score += p.get("_category_similarity", 0) * 0.3
+        score += p.get("_brand_similarity", 0) * 0.2
+        score += p.get("_color_similarity", 0) * 0.1
+        score += sum(10 for f in features if f in p["features"])
+        if p["stock"] == 0:
+            score -= 50
+        elif p["stock"] < 3:
+            score -= 20
+        scored.append((score, p["id"]))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return scored
+
+
+def _reference_fuzzy(rows, name=None, category=None, brand=None, color=None):
+    """One fuzz call per (query, row) pair in Python loops: name, category, brand, color passes."""
+    from rapidfuzz import fuzz
+    products = [(p, {}) for p in rows]
+    if name:
+        q = name.lower()
+        filtered = []
+        for p, sims in products:
+            similarity = fuzz.partial_ratio(q, p["name"].lower())
+            if similarity >= 60:
+                sims["_name_similarity"] = similarity
+                filtered.append((p, sims))
+        products = filtered
+    for key, query in (("category", category), ("brand", brand), ("color", color)):
+        if query:
+            q = query.lower()
+            filtered = []
+            for p, sims in products:
+                similarity = fuzz.ratio(q, p[key].lower())
+                if similarity >= 70:
+                    sims[f"_{key}_similarity"] = similarity
+                    filtered.append((p, sims))
+            products = filtered
+    return {p["id"]: sims for p, sims in products}
+
+
+def _reference_best_name(rows, product_name):
+    """get_product_id_by_name's original linear scan."""
+    from rapidfuzz import fuzz
+    q = product_name.lower()
+    best_id, best_score = None, 0
+    for p in rows:
+        similarity = fuzz.partial_ratio(q, p["name"].lower())
+        if similarity > best_score:
+            best_score = similarity
+            best_id = p["id"]
+    return (best_id, best_score) if best_id is not None and best_score >= 60 else None
+
+
+def bench_fuzzy(sizes: List[int]):
+    """Per-pair fuzz loops vs. the batched (n-gram shortlist + process.cdist) path."""
+    print(f"{'rows':>9} {'query':<72} {'per-pair':>10} {'batched':>10} {'speedup':>8}")
+    for n in sizes:
+        rows = synthetic_catalog(n)
+        index = CatalogIndex.from_rows(rows)
+        index.name_index()
+        for query in FUZZY_QUERIES:
+            expected = _reference_fuzzy(rows, **query)
+            positions, sims, _, _ = index.search(**query)
+            got = {index.ids[p]: {k: v[i] for k, v in sims.items()} for i, p in enumerate(positions.tolist())}
+            assert got == expected, f"similarity mismatch for {query}"
+            t_old = _timed(lambda: _reference_fuzzy(rows, **query))
+            t_new = _timed(lambda: index.search(**query))
+            print(f"{n:>9} {str(query):<72} {t_old * 1000:>9.1f}ms {t_new * 1000:>9.1f}ms {t_old / t_new:>7.1f}x")
+        for lookup in NAME_LOOKUPS:
+            expected = _reference_best_name(rows, lookup)
+            match = index.name_index().best_match(lookup.lower())
+            got = (index.ids[match[0]], match[1]) if match else None
+            assert got == expected, f"best match mismatch for {lookup!r}"
+            t_old = _timed(lambda: _reference_best_name(rows, lookup))
+            t_new = _timed(lambda: index.name_index().best_match(lookup.lower()))
+            label = f"best name: {lookup!r}"
+            print(f"{n:>9} {label:<72} {t_old * 1000:>9.1f}ms {t_new * 1000:>9.1f}ms {t_old / t_new:>7.1f}x")
+        del rows, index
+
+
+def bench_scoring(sizes: List[int], k: int = 20):
+    """Per-row Python scoring + full sort vs. CatalogIndex.search (full ranking and top-k)."""
+    print(f"{'rows':>9} {'query':<55} {'python':>9} {'numpy':>9} {'top-k':>9} {'speedup':>8}")
+    for n in sizes:
+        rows = synthetic_catalog(n)
+        index = CatalogIndex.from_rows(rows)
+        index.columns()
+        for query in SCORING_QUERIES:
+            expected = _reference_search(rows, **query)
+            positions, _, scores, _ = index.search(**query)
+            got = [(s, index.ids[p]) for s, p in zip(scores.tolist(), positions.tolist())]
+            assert got == expected, f"ranking mismatch for {query}"
+            top, _, _, _ = index.search(**query, k=k)
+            assert top.tolist() == positions[:k].tolist(), f"top-{k} mismatch for {query}"
+
+            t_python = _timed(lambda: _reference_search(rows, **query))
+            t_numpy = _timed(lambda: index.search(**query))
+            t_topk = _timed(lambda: index.search(**query, k=k))
+            print(f"{n:>9} {str(query):<55} {t_python * 1000:>8.1f}ms {t_numpy * 1000:>8.1f}ms "
+                  f"{t_topk * 1000:>8.1f}ms {t_python / t_topk:>7.1f}x")
+        del rows, index
+
+
+# The engine SQLProductStore used to create: rollback journal, default pool, no pragmas
+ROLLBACK_PROFILE = {"pragmas": {"journal_mode": "DELETE"}}
+
+READ_ORDERS = text("SELECT * FROM orders WHERE user_id = :user ORDER BY order_id DESC LIMIT 20")
+READ_PRODUCTS = text("SELECT * FROM products WHERE price <= :price")
+
+
+def _bench_store(tmp: str, profile: Dict[str, Any]) -> SQLProductStore:
+    seed = [{**p, "stock": 10 ** 9} for p in SEED_PRODUCTS]
+    return SQLProductStore(f"sqlite:///{os.path.join(tmp, 'bench.db')}", seed_data=seed, engine_profile=profile)
+
+
+def _read_during_commit(profile: Dict[str, Any], hold: float) -> float:
+    """
+    Latency of one catalog read issued while a writer holds the database's exclusive write
+    lock for `hold` seconds, the lock a committing transaction takes.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _bench_store(tmp, profile)
+        writer = store.engine.raw_connection()
+        cursor = writer.cursor()
+        cursor.execute("BEGIN EXCLUSIVE")
+        cursor.execute("UPDATE products SET stock = stock - 1 WHERE id = 1")
+        elapsed = []
+
+        def read():
+            start = time.perf_counter()
+            with store.engine.connect() as conn:
+                conn.execute(READ_PRODUCTS, {"price": 30000}).all()
+            elapsed.append(time.perf_counter() - start)
+
+        t = threading.Thread(target=read)
+        t.start()
+        time.sleep(hold)
+        writer.commit()
+        t.join()
+        writer.close()
+        store.engine.dispose()
+        return elapsed[0]
+
+
+def _concurrency_run(profile: Dict[str, Any], readers: int, writers: int, seconds: float) -> Dict[str, Any]:
+    """Readers query orders/products while writers place orders, all on one file database."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _bench_store(tmp, profile)
+        stop = threading.Event()
+        latencies: List[float] = []
+        counts = {"reads": 0, "read_errors": 0, "writes": 0, "write_errors": 0}
+        lock = threading.Lock()
+
+        def reader(i):
+            local, errors = [], 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    with store.engine.connect() as conn:
+                        conn.execute(READ_ORDERS, {"user": f"user{i % 4}"}).all()
+                        conn.execute(READ_PRODUCTS, {"price": 30000}).all()
+                except OperationalError:
+                    errors += 1
+                    continue
+                local.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(local)
+                counts["reads"] += len(local)
+                counts["read_errors"] += errors
+
+        def writer(i):
+            ok = failed = 0
+            while not stop.is_set():
+                result = store.place_order(f"user{i % 4}", random.randint(1, len(SEED_PRODUCTS)), 1)
+                if result["ok"]:
+                    ok += 1
+                else:
+                    failed += 1
+            with lock:
+                counts["writes"] += ok
+                counts["write_errors"] += failed
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        store.engine.dispose()
+
+    latencies.sort()
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else float("nan")
+    return {
+        **counts,
+        "p50": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p99": pct(0.99),
+        "max": latencies[-1] * 1000 if latencies else float("nan"),
+    }
+
+
+def bench_concurrency(readers: int = 8, writers: int = 2, seconds: float = 5.0, hold: float = 0.2):
+    """Read latency and throughput under concurrent order writes: rollback journal vs. the WAL profile."""
+    profiles = (("rollback journal", ROLLBACK_PROFILE), ("WAL profile", SQLITE_ENGINE_PROFILE))
+    print(f"one read while a writer holds the write lock for {hold * 1000:.0f}ms")
+    for label, profile in profiles:
+        print(f"{label:<18} {_read_during_commit(profile, hold) * 1000:>9.2f}ms")
+    print()
+    print(f"{readers} reader / {writers} writer threads for {seconds:.0f}s each")
+    print(f"{'profile':<18} {'reads/s':>9} {'p50':>9} {'p99':>9} {'max':>9} {'read err':>9} {'writes/s':>9} {'write err':>10}")
+    for label, profile in profiles:
+        r = _concurrency_run(profile, readers, writers, seconds)
+        print(f"{label:<18} {r['reads'] / seconds:>9.0f} {r['p50']:>7.2f}ms {r['p99']:>7.2f}ms {r['max']:>7.1f}ms "
+              f"{r['read_errors']:>9} {r['writes'] / seconds:>9.0f} {r['write_errors']:>10}")
+
+
+# The store's hot queries and the index each one must be planned on
+INDEXED_QUERIES = [
+    ("order history", select(Order).where(Order.user_id == "user7").order_by(Order.order_id.desc()).limit(10),
+     "ix_orders_user_id_order_id"),
+    ("return count", select(func.count()).select_from(OrderReturn).join(Order).where(Order.user_id == "user7"),
+     "ix_order_returns_order_id"),
+    ("category + price", select(Product).where(Product.category == "laptops", Product.price <= 50000),
+     "ix_products_category_price"),
+    ("brand", select(Product).where(Product.brand == "samsung"), "ix_products_brand"),
+]
+
+
+def _fill_orders(store: SQLProductStore, n: int, users: int = 2000):
+    rnd = random.Random(0)
+    with store.engine.begin() as conn:
+        conn.execute(insert(User), [{"user_id": f"user{u}"} for u in range(users)])
+        conn.execute(insert(Order), [{
+            "user_id": f"user{rnd.randrange(users)}", "product_id": rnd.randint(1, len(SEED_PRODUCTS)),
+            "quantity": 1, "total_price": 100.0, "status": OrderStatus.CONFIRMED,
+        } for _ in range(n)])
+        conn.execute(insert(OrderReturn), [{
+            "order_id": rnd.randint(1, n), "reason": "damaged", "status": ReturnStatus.REQUESTED, "refund_amount": 100.0,
+        } for _ in range(n // 20)])
+
+
+def bench_indexes(orders: int = 200_000):
+    """EXPLAIN QUERY PLAN check that the hot queries use their indexes, then timings with and without them."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLProductStore(f"sqlite:///{os.path.join(tmp, 'bench.db')}", seed_data=SEED_PRODUCTS)
+        _fill_orders(store, orders)
+        compiled = [(label, str(q.compile(store.engine, compile_kwargs={"literal_binds": True})), index)
+                    for label, q, index in INDEXED_QUERIES]
+        with store.engine.connect() as conn:
+            conn.execute(text("ANALYZE"))
+            for label, sql, index in compiled:
+                plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+                print(f"{label}: {' | '.join(plan)}")
+                assert any(index in step for step in plan), f"{label} does not use {index}"
+                assert not any("TEMP B-TREE" in step for step in plan), f"{label} sorts in a temp b-tree"
+
+            print(f"\n{orders} orders {'query':<20} {'indexed':>10} {'no index':>10} {'speedup':>8}")
+            timings = {label: _timed(lambda: conn.execute(text(sql)).all(), repeat=20) for label, sql, _ in compiled}
+            for _, _, index in compiled:
+                conn.execute(text(f"DROP INDEX {index}"))
+            for label, sql, _ in compiled:
+                t_scan = _timed(lambda: conn.execute(text(sql)).all(), repeat=20)
+                print(f"{'':>{len(str(orders)) + 7}} {label:<20} {timings[label] * 1000:>8.3f}ms {t_scan * 1000:>8.3f}ms "
+                      f"{t_scan / timings[label]:>7.1f}x")
+        store.engine.dispose()
+
+
+@contextlib.contextmanager
+def _count_statements(engine):
+    """Count the SQL statements an engine (sync or async) executes inside the block."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    counter = {"n": 0}
+
+    def count(*args):
+        counter["n"] += 1
+
+    event.listen(sync_engine, "before_cursor_execute", count)
+    try:
+        yield counter
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count)
+
+
+def _lazy_user_orders(store: SQLProductStore, user_id: str, limit: int):
+    """get_user_orders without eager loading: one lazy product SELECT per distinct product."""
+    with Session(store.engine) as ses:
+        q = ses.query(Order).filter(Order.user_id == user_id).order_by(Order.order_id.desc()).limit(limit)
+        return [o.to_dict() for o in q.all()]
+
+
+def bench_queries(limits: List[int]):
+    """
+    Statements per call for the order/return lookups (eager loading) vs. lazy relationship
+    loads. tests/test_query_counts.py asserts the one-statement counts.
+    """
+    user = "bench"
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        catalog = synthetic_catalog(max(limits))
+        seed = [{**p, "stock": 10 ** 6} for p in catalog]
+        store = SQLProductStore(url, seed_data=seed)
+        async_store = AsyncSQLProductStore(store, url.replace("sqlite://", "sqlite+aiosqlite://"))
+        with store.engine.begin() as conn:
+            conn.execute(insert(User), [{"user_id": user}])
+            # every order on a different product, so lazy loading cannot hit the identity map
+            conn.execute(insert(Order), [{
+                "user_id": user, "product_id": p["id"], "quantity": 1, "total_price": p["price"],
+                "status": OrderStatus.CONFIRMED,
+            } for p in catalog])
+            conn.execute(insert(OrderReturn), [{
+                "order_id": 1, "reason": "damaged", "status": ReturnStatus.REQUESTED, "refund_amount": 1.0,
+            }])
+
+        def statements(engine, fn):
+            with _count_statements(engine) as counter:
+                fn()
+            return counter["n"]
+
+        run = lambda coro_fn: (lambda: asyncio.run(coro_fn()))
+        print(f"{'call':<32} {'lazy':>6} {'eager':>6} {'async':>6} {'lazy time':>10} {'eager time':>11}")
+        for limit in limits:
+            expected = _lazy_user_orders(store, user, limit)
+            assert store.get_user_orders(user, limit) == expected
+            lazy = statements(store.engine, lambda: _lazy_user_orders(store, user, limit))
+            eager = statements(store.engine, lambda: store.get_user_orders(user, limit))
+            async_eager = statements(async_store.engine, run(lambda: async_store.get_user_orders(user, limit)))
+            t_lazy = _timed(lambda: _lazy_user_orders(store, user, limit), repeat=10)
+            t_eager = _timed(lambda: store.get_user_orders(user, limit), repeat=10)
+            print(f"{f'get_user_orders(limit={limit})':<32} {lazy:>6} {eager:>6} {async_eager:>6} "
+                  f"{t_lazy * 1000:>8.2f}ms {t_eager * 1000:>9.2f}ms")
+        for label, sync_call, async_call in (
+            ("get_order", lambda: store.get_order(user, 1), lambda: async_store.get_order(user, 1)),
+            ("get_return_status", lambda: store.get_return_status(user, 1), lambda: async_store.get_return_status(user, 1)),
+        ):
+            eager = statements(store.engine, sync_call)
+            async_eager = statements(async_store.engine, run(async_call))
+            print(f"{label:<32} {'':>6} {eager:>6} {async_eager:>6}")
+        asyncio.run(async_store.close())
+        store.engine.dispose()
+
+
+def _racy_place_order(store: SQLProductStore, user_id: str, pid: int, qty: int) -> Dict[str, Any]:
+    """place_order's previous read-check-write: user commit, stock check in Python, write back."""
+    try:
+        with Session(store.engine) as ses:
+            if not ses.get(User, user_id):
+                ses.add(User(user_id=user_id))
+                ses.commit()
+            prod = ses.get(Product, pid)
+            if prod.stock < qty:
+                return {"ok": False, "message": f"Only {prod.stock} left in stock."}
+            ses.add(Order(user_id=user_id, product_id=pid, quantity=qty, total_price=prod.price * qty,
+                          status=OrderStatus.CONFIRMED))
+            prod.stock = prod.stock - qty
+            ses.commit()
+            return {"ok": True}
+    except Exception as e:
+        return {"ok": False, "message": str(e)}
+
+
+def _order_stress(place, threads: int, stock: int, qty: int = 1) -> Dict[str, Any]:
+    """`threads` users race to buy one product with `stock` units until it sells out."""
+    with tempfile.TemporaryDirectory() as tmp:
+        seed = [{**SEED_PRODUCTS[0], "stock": stock}]
+        store = SQLProductStore(f"sqlite:///{os.path.join(tmp, 'bench.db')}", seed_data=seed)
+        pid = seed[0]["id"]
+        placed = [0] * threads
+        errors = [0] * threads
+
+        def buyer(i):
+            while True:
+                result = place(store, f"user{i}", pid, qty)
+                if result["ok"]:
+                    placed[i] += 1
+                elif "left in stock" in result["message"]:
+                    return
+                else:
+                    errors[i] += 1
+
+        workers = [threading.Thread(target=buyer, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+        with store.engine.connect() as conn:
+            final_stock = conn.scalar(select(Product.stock).where(Product.id == pid))
+            ordered = conn.scalar(select(func.coalesce(func.sum(Order.quantity), 0)))
+        store.engine.dispose()
+    return {"orders": sum(placed), "errors": sum(errors), "ordered_units": ordered,
+            "final_stock": final_stock, "oversold": ordered - stock, "orders_per_s": sum(placed) / elapsed}
+
+
+def bench_orders(threads: int = 16, stock: int = 2000):
+    """
+    Concurrent place_order stress: units sold, oversold count and orders per second per path.
+    tests/test_orders.py asserts that place_order and place_orders_bulk never oversell.
+    """
+    print(f"{threads} threads buying one product with {stock} units")
+    print(f"{'path':<22} {'orders':>7} {'units':>7} {'final stock':>12} {'oversold':>9} {'errors':>7} {'orders/s':>9}")
+    for label, place in (("read-check-write", _racy_place_order),
+                         ("conditional UPDATE", lambda store, *args: store.place_order(*args))):
+        r = _order_stress(place, threads, stock)
+        print(f"{label:<22} {r['orders']:>7} {r['ordered_units']:>7} {r['final_stock']:>12} {r['oversold']:>9} "
+              f"{r['errors']:>7} {r['orders_per_s']:>9.0f}")
+
+
+def bench_cart(line_counts: List[int]):
+    """Cart checkout: one place_order transaction per line vs. a single place_orders_bulk."""
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = [{**p, "stock": 10 ** 9} for p in synthetic_catalog(max(line_counts))]
+        store = SQLProductStore(f"sqlite:///{os.path.join(tmp, 'bench.db')}", seed_data=catalog)
+        print(f"{'lines':>6} {'per-line':>10} {'bulk':>10} {'speedup':>8}")
+        for n in line_counts:
+            cart = [(p["id"], 1) for p in catalog[:n]]
+            t_single = _timed(lambda: [store.place_order("bench", pid, qty) for pid, qty in cart], repeat=5)
+            t_bulk = _timed(lambda: store.place_orders_bulk("bench", cart), repeat=5)
+            print(f"{n:>6} {t_single * 1000:>8.2f}ms {t_bulk * 1000:>8.2f}ms {t_single / t_bulk:>7.1f}x")
+        store.engine.dispose()
+
+
+def _catalog_store(tmp: str, rows: List[Dict[str, Any]]) -> SQLProductStore:
+    """
+    A store over rows inserted the way older files hold them (JSON features), then backfilled.
+    The full-text index is built afterwards in one pass, as for an existing database file.
+    """
+    store = SQLProductStore(f"sqlite:///{os.path.join(tmp, 'bench.db')}", full_text=False)
+    with store.engine.begin() as conn:
+        conn.execute(insert(Product), [{**p, "features": json.dumps(p["features"])} for p in rows])
+    store._backfill_product_features()
+    store.full_text = store._create_full_text_index()
+    return store
+
+
+FEATURE_FILTERS = [["lightweight"], ["5g", "camera"], ["noise-cancelling", "wireless", "gaming"]]
+
+
+def bench_features(sizes: List[int]):
+    """
+    Catalog index rebuild from the JSON features column vs. product_features, and feature
+    filtering as a per-row scan vs. the (tag, product_id) index vs. the resident tag bitset.
+    """
+    print(f"{'rows':>9} {'step':<62} {'before':>10} {'after':>10} {'speedup':>8}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            rows = synthetic_catalog(n)
+            store = _catalog_store(tmp, rows)
+
+            def json_rebuild():
+                with store.engine.connect() as conn:
+                    db_rows = conn.execute(select(Product.__table__).order_by(Product.id)).mappings()
+                    return CatalogIndex.from_rows({**r, "features": json.loads(r["features"])} for r in db_rows)
+
+            def tag_rebuild():
+                store._bump_catalog_version()
+                return store.catalog_index()
+
+            old_index, new_index = json_rebuild(), tag_rebuild()
+            assert [new_index.materialize(i) for i in range(n)] == [old_index.materialize(i) for i in range(n)], \
+                "index rebuild mismatch"
+            t_old, t_new = _timed(json_rebuild), _timed(tag_rebuild)
+            print(f"{n:>9} {'index rebuild':<62} {t_old * 1000:>8.1f}ms {t_new * 1000:>8.1f}ms {t_old / t_new:>7.1f}x")
+
+            index = store.catalog_index()
+            for tags in FEATURE_FILTERS:
+                expected = [p["id"] for p in rows if any(f in p["features"] for f in tags)]
+                assert store.product_ids_with_features(tags) == expected, f"tag index mismatch for {tags}"
+                positions = index.search(features=tags)[0]
+                assert sorted(index.ids[p] for p in positions.tolist()) == expected, f"bitset mismatch for {tags}"
+                t_scan = _timed(lambda: [p["id"] for p in rows if any(f in p["features"] for f in tags)])
+                t_sql = _timed(lambda: store.product_ids_with_features(tags))
+                t_bits = _timed(lambda: index.search(features=tags))
+                print(f"{n:>9} {'filter ' + str(tags) + ' (sql index)':<62} {t_scan * 1000:>8.2f}ms {t_sql * 1000:>8.2f}ms "
+                      f"{t_scan / t_sql:>7.1f}x")
+                print(f"{n:>9} {'filter ' + str(tags) + ' (bitset)':<62} {t_scan * 1000:>8.2f}ms {t_bits * 1000:>8.2f}ms "
+                      f"{t_scan / t_bits:>7.1f}x")
+            store.engine.dispose()
+
+
+def _reference_model_to_dict(obj) -> Dict[str, Any]:
+    """SQLProductStore._model_to_dict before the compiled serializer."""
+    from datetime import datetime
+    out = {}
+    for col in obj.__table__.columns:
+        val = getattr(obj, col.name)
+        if isinstance(val, (list, dict)):
+            out[col.name] = val
+        elif isinstance(val, datetime):
+            out[col.name] = val.isoformat()
+        elif hasattr(val, 'value'):
+            out[col.name] = val.value
+        else:
+            out[col.name] = val
+    if "features" in out and isinstance(out["features"], str):
+        try:
+            out["features"] = json.loads(out["features"])
+        except Exception:
+            pass
+    return out
+
+
+def _reference_list_products(store: SQLProductStore) -> List[Dict[str, Any]]:
+    with Session(store.engine) as ses:
+        return [_reference_model_to_dict(p) for p in ses.query(Product).options(undefer(Product.features)).all()]
+
+
+def bench_serialize(sizes: List[int]):
+    """
+    list_products: ORM objects + the per-column _model_to_dict loop vs. Core rows + the
+    compiled RowSerializer, end to end and for the row-to-dict step alone.
+    """
+    print(f"{'rows':>9} {'step':<24} {'orm+loop':>10} {'compiled':>10} {'speedup':>8} {'per row':>16}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = _catalog_store(tmp, synthetic_catalog(n))
+            expected = _reference_list_products(store)
+            got = store.list_products()
+            assert got == expected and [list(p) for p in got] == [list(p) for p in expected], "list_products mismatch"
+
+            with Session(store.engine) as ses, store.engine.connect() as conn:
+                objects = ses.query(Product).options(undefer(Product.features)).all()
+                rows = conn.execute(PRODUCT_ROWS).all()
+                tags = _feature_lists(conn.execute(FEATURE_ROWS))
+                t_old = _timed(lambda: [_reference_model_to_dict(p) for p in objects])
+                t_new = _timed(lambda: _product_dicts(rows, tags))
+            print(f"{n:>9} {'row -> dict':<24} {t_old * 1000:>8.1f}ms {t_new * 1000:>8.1f}ms {t_old / t_new:>7.1f}x "
+                  f"{t_old / n * 1e6:>6.2f} -> {t_new / n * 1e6:.2f}us")
+            t_old = _timed(lambda: _reference_list_products(store))
+            t_new = _timed(store.list_products)
+            print(f"{n:>9} {'list_products()':<24} {t_old * 1000:>8.1f}ms {t_new * 1000:>8.1f}ms {t_old / t_new:>7.1f}x "
+                  f"{t_old / n * 1e6:>6.2f} -> {t_new / n * 1e6:.2f}us")
+            store.engine.dispose()
+
+
+PUSHDOWN_QUERIES = SCORING_QUERIES + [
+    {"name": "galaxy", "category": "smartphones", "max_price": 40000},
+    {"brand": "samsung", "features": ["amoled"]},
+]
+
+
+def bench_pushdown(sizes: List[int], k: int = 20):
+    """
+    A search with no current resident index: rebuild the index from the whole table and
+    search it vs. search_products() in SQL. Both must return the same ranking and values.
+    """
+    print(f"{'rows':>9} {'query':<72} {'found':>7} {'rebuild':>10} {'sql':>10} {'speedup':>8}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = _catalog_store(tmp, synthetic_catalog(n))
+            for query in PUSHDOWN_QUERIES:
+                def rebuild_and_search():
+                    store._bump_catalog_version()
+                    index = store.catalog_index()
+                    return index, index.search(**query, k=k)
+
+                index, (positions, sims, scores, total) = rebuild_and_search()
+                expected = []
+                for i, pos in enumerate(positions.tolist()):
+                    p = index.materialize(pos)
+                    p.update({key: float(sim[i]) for key, sim in sims.items()})
+                    p["_score"] = float(scores[i])
+                    expected.append(p)
+                assert store.search_products(**query, k=k) == (expected, total), f"pushdown mismatch for {query}"
+                t_old = _timed(rebuild_and_search)
+                t_new = _timed(lambda: store.search_products(**query, k=k))
+                print(f"{n:>9} {str(query):<72} {total:>7} {t_old * 1000:>8.1f}ms {t_new * 1000:>8.1f}ms {t_old / t_new:>7.1f}x")
+            store.engine.dispose()
+
+
+FTS_QUERIES = ["galaxy", "galxy watch", "noise cancel", "gaming laptop", "fast charging phone", "nike revolution 12"]
+
+
+def bench_fts(sizes: List[int], k: int = 20):
+    """
+    Query mode: FTS5 trigram retrieval of the bm25 top candidates, alone and followed by the
+    scoring formula, vs. the fuzzy partial_ratio name scan over the resident index.
+    """
+    from tools import FTS_CANDIDATES
+    print(f"{'rows':>9} {'query':<24} {'fts':>10} {'fts+score':>10} {'name scan':>10} {'found':>7}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = _catalog_store(tmp, synthetic_catalog(n))
+            index = store.catalog_index()
+            index.name_index()
+            for query in FTS_QUERIES:
+                def fts_search():
+                    candidates, _ = store.text_search(query, FTS_CANDIDATES)
+                    return index.search(query=query, candidates=candidates, k=k)
+
+                total = fts_search()[3]
+                t_fts = _timed(lambda: store.text_search(query, FTS_CANDIDATES))
+                t_query = _timed(fts_search)
+                t_name = _timed(lambda: index.search(name=query, k=k))
+                print(f"{n:>9} {query:<24} {t_fts * 1000:>8.2f}ms {t_query * 1000:>8.2f}ms {t_name * 1000:>8.2f}ms {total:>7}")
+            store.engine.dispose()
+
+
+# (query, categories a relevant result belongs to). None of them names its category; the
+# embedder's concepts are learned from the catalog's categories, not from these queries.
+# The last two use words the catalog never does: the hashing embedder is expected to miss
+# them, a model given through $SHOPGENIE_EMBEDDING_MODEL should not.
+SEMANTIC_QUERIES = [
+    ("cushioned breathable", {"running shoes"}),
+    ("noise cancelling wireless", {"headphones", "earphones"}),
+    ("amoled 5g fast charging", {"smartphones"}),
+    ("rgb ryzen 165hz", {"laptops"}),
+    ("ergonomic silent clicks", {"computer accessories"}),
+    ("dslr dual pixel", {"cameras"}),
+    ("health tracking gps", {"wearables"}),
+    ("kids mode full hd", {"tablets"}),
+    ("something for jogging", {"running shoes"}),
+    ("quiet music on the commute", {"headphones", "earphones"}),
+]
+
+
+def bench_semantic(sizes: List[int], k: int = 20):
+    """
+    Semantic mode: embedding build and reload from the memory-mapped file, per-query nearest
+    neighbours brute force vs. IVF (recall = share of the IVF top k at least as similar as the
+    brute-force k-th, so ties count), relevance (precision = share of the top k in the
+    query's categories), the full semantic search, and a check that the resident index and
+    search_products() rank its candidates identically.
+    """
+    from tools import SEMANTIC_CANDIDATES
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            rows = synthetic_catalog(n)
+            category_of = {row["id"]: row["category"] for row in rows}
+            store = _catalog_store(tmp, rows)
+            start = time.perf_counter()
+            ivf = store.semantic_index()
+            t_build = time.perf_counter() - start
+            store._semantic_index = None
+            start = time.perf_counter()
+            store.semantic_index()
+            t_load = time.perf_counter() - start
+            # The same vectors without the IVF lists, so search() scans every row
+            brute = SemanticIndex(ivf.ids, ivf.vectors, ivf.embedder)
+            index = store.catalog_index()
+            print(f"{n} rows: build {t_build:.2f}s, reload {t_load * 1000:.1f}ms, {ivf.embedder.name} embedder, "
+                  f"{'IVF' if ivf.centroids is not None else 'brute force'} (nprobe {NPROBE})")
+            print(f"{'query':<28} {'brute':>9} {'ann':>9} {'recall':>7} {'prec':>5} {'search':>9} {'same':>5}")
+            for query, relevant in SEMANTIC_QUERIES:
+                _, brute_sims = brute.search(query, k)
+                _, ann_sims = ivf.search(query, k)
+                recall = float((ann_sims >= brute_sims[-1] - 1e-6).sum()) / len(brute_sims) if len(brute_sims) else 1.0
+
+                def semantic_search():
+                    scores = store.semantic_search(query, SEMANTIC_CANDIDATES)
+                    return scores, index.search(candidates=list(scores), candidate_scores=scores, k=k)
+
+                scores, (positions, _, index_scores, _) = semantic_search()
+                found = [int(index.ids[p]) for p in positions.tolist()]
+                precision = sum(category_of[pid] in relevant for pid in found) / k
+                products, _ = store.search_products(candidates=list(scores), candidate_scores=scores, k=k)
+                same = (found == [p["id"] for p in products]
+                        and index_scores.tolist() == [p["_score"] for p in products])
+                t_brute = _timed(lambda: brute.search(query, k))
+                t_ann = _timed(lambda: ivf.search(query, k))
+                t_search = _timed(semantic_search)
+                print(f"{query:<28} {t_brute * 1000:>7.2f}ms {t_ann * 1000:>7.2f}ms {recall:>7.2f} {precision:>5.2f} "
+                      f"{t_search * 1000:>7.2f}ms {str(same):>5}")
+            store.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="suite", required=True)
+
+    scoring = sub.add_parser("scoring", help="vectorized filter/score/top-k vs. the per-row loop")
+    scoring.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    scoring.add_argument("-k", type=int, default=20)
+
+    fuzzy = sub.add_parser("fuzzy", help="batched fuzzy matching vs. per-pair fuzz calls")
+    fuzzy.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+
+    concurrency = sub.add_parser("concurrency", help="read latency under concurrent order writes, per engine profile")
+    concurrency.add_argument("--readers", type=int, default=8)
+    concurrency.add_argument("--writers", type=int, default=2)
+    concurrency.add_argument("--seconds", type=float, default=5.0)
+    concurrency.add_argument("--hold", type=float, default=0.2, help="seconds the writer holds the write lock")
+
+    indexes = sub.add_parser("indexes", help="EXPLAIN check and timings for the order/return/product indexes")
+    indexes.add_argument("--orders", type=int, default=200_000)
+
+    queries = sub.add_parser("queries", help="statements per order/return lookup (N+1 check)")
+    queries.add_argument("--limits", type=int, nargs="+", default=[5, 20, 50])
+
+    orders = sub.add_parser("orders", help="multi-threaded place_order stress: no overselling, orders/s")
+    orders.add_argument("--threads", type=int, default=16)
+    orders.add_argument("--stock", type=int, default=2000)
+
+    cart = sub.add_parser("cart", help="bulk cart checkout vs. one order transaction per line")
+    cart.add_argument("--lines", type=int, nargs="+", default=[1, 5, 20, 50])
+
+    features = sub.add_parser("features", help="catalog rebuild and feature filtering over product_features")
+    features.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+
+    serialize = sub.add_parser("serialize", help="list_products row serialization: ORM + per-column loop vs. compiled")
+    serialize.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+
+    pushdown = sub.add_parser("pushdown", help="search without a resident index: full rebuild vs. SQL push-down")
+    pushdown.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    pushdown.add_argument("-k", type=int, default=20)
+
+    fts = sub.add_parser("fts", help="full-text query mode (FTS5 + scoring) vs. the fuzzy name scan")
+    fts.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    fts.add_argument("-k", type=int, default=20)
+
+    semantic = sub.add_parser("semantic", help="semantic mode: embedding build, brute force vs. IVF, recall")
+    semantic.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    semantic.add_argument("-k", type=int, default=20)
+
+    args = parser.parse_args()
+    if args.suite == "scoring":
+        bench_scoring(args.sizes, args.k)
+    elif args.suite == "fuzzy":
+        bench_fuzzy(args.sizes)
+    elif args.suite == "concurrency":
+        bench_concurrency(args.readers, args.writers, args.seconds, args.hold)
+    elif args.suite == "indexes":
+        bench_indexes(args.orders)
+    elif args.suite == "queries":
+        bench_queries(args.limits)
+    elif args.suite == "orders":
+        bench_orders(args.threads, args.stock)
+    elif args.suite == "cart":
+        bench_cart(args.lines)
+    elif args.suite == "features":
+        bench_features(args.sizes)
+    elif args.suite == "serialize":
+        bench_serialize(args.sizes)
+    elif args.suite == "pushdown":
+        bench_pushdown(args.sizes, args.k)
+    elif args.suite == "fts":
+        bench_fts(args.sizes, args.k)
+    elif args.suite == "semantic":
+        bench_semantic(args.sizes, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,620 @@
+from array import array
+from itertools import chain
+import re
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple
+from rapidfuzz import fuzz, process
+import numpy as np
+import heapq
+
+# Score bonus per similarity, in the order the similarities appear on result rows
+SIMILARITY_WEIGHTS = (
+    ("_name_similarity", 0.5),
+    ("_category_similarity", 0.3),
+    ("_brand_similarity", 0.2),
+    ("_color_similarity", 0.1),
+)
+
+
+class Vocabulary:
+    """
+    Interns low-cardinality strings (brand, category, color, feature tags) to small int codes.
+
+    Fuzzy lookups are scored against the distinct values only and memoized, so matching a
+    query costs one fuzz call per distinct value the first time and a dict hit afterwards.
+    """
+
+    # Bound on memoized queries per vocabulary; the memo is simply reset when it fills up
+    MATCH_CACHE_SIZE = 1024
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self.lowered: List[str] = []
+        self._codes: Dict[Any, int] = {}
+        self._matches: Dict[Tuple[str, float], np.ndarray] = {}
+
+    def intern(self, value) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+            self.lowered.append(value.lower() if isinstance(value, str) else "")
+        return code
+
+    def code(self, value) -> Optional[int]:
+        return self._codes.get(value)
+
+    def match(self, query_lower: str, cutoff: float = 70) -> np.ndarray:
+        """fuzz.ratio of the query against every distinct value, 0 where below cutoff (memoized)."""
+        key = (query_lower, cutoff)
+        table = self._matches.get(key)
+        if table is None:
+            table = batch_scores(fuzz.ratio, query_lower, self.lowered, cutoff)
+            table.flags.writeable = False
+            if len(self._matches) >= self.MATCH_CACHE_SIZE:
+                self._matches.clear()
+            self._matches[key] = table
+        return table
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class NameIndex:
+    """
+    N-gram index over lowercased product names, sharing one character alphabet:
+
+      * a per-row character count matrix (1-grams), used by candidates() to shortlist rows
+        for fuzz.partial_ratio without ever dropping a row that could reach the cutoff;
+      * a trigram inverted index in CSR form, used by best_match() to score the most
+        likely rows first so the cutoff can be raised before the full shortlist is built.
+
+    Trigrams alone cannot give the guarantee: at a 60% cutoff the q-gram lemma bound is
+    negative for q >= 2, so a row sharing no trigram with the query can still score 60.
+    """
+
+    # Character counts are stored as uint8; longer queries skip the filter rather than risk
+    # undercounting a saturated column.
+    MAX_FILTER_QUERY = 255
+
+    def __init__(self, names_lower: List[str]):
+        self.names_lower = names_lower
+        n = len(names_lower)
+        self.lengths = np.fromiter((len(s) for s in names_lower), dtype=np.int64, count=n)
+        text = np.frombuffer("".join(names_lower).encode("utf-32-le"), dtype=np.uint32)
+        present = np.bincount(text) > 0 if len(text) else np.zeros(0, dtype=bool)
+        self.alphabet = np.flatnonzero(present).astype(np.uint32)
+        chars = (np.cumsum(present) - 1)[text]
+        a = len(self.alphabet)
+        row_of = np.repeat(np.arange(n, dtype=np.int64), self.lengths)
+
+        # 1-gram counts per row
+        self.counts = np.zeros((n, a), dtype=np.uint8)
+        if len(chars):
+            cells, cell_counts = _sorted_unique(row_of * a + chars)
+            self.counts[cells // a, cells % a] = np.minimum(cell_counts, 255)
+
+        # Trigram postings: distinct (trigram, row) pairs sorted by trigram
+        offset_in_name = np.arange(len(chars)) - np.repeat(np.cumsum(self.lengths) - self.lengths, self.lengths)
+        starts = np.flatnonzero(offset_in_name <= np.repeat(self.lengths, self.lengths) - 3)
+        trigrams = (chars[starts] * a + chars[starts + 1]) * a + chars[starts + 2]
+        pairs, _ = _sorted_unique(trigrams * max(n, 1) + row_of[starts])
+        self._tri_rows = pairs % max(n, 1)
+        self._tri_codes, self._tri_starts = np.unique(pairs // max(n, 1), return_index=True)
+        self._tri_starts = np.append(self._tri_starts, len(pairs))
+
+    def _query_chars(self, query: str) -> np.ndarray:
+        """Alphabet positions of the query's characters; -1 for characters no name contains."""
+        points = np.frombuffer(query.encode("utf-32-le"), dtype=np.uint32)
+        cols = np.searchsorted(self.alphabet, points)
+        known = cols < len(self.alphabet)
+        known[known] = self.alphabet[cols[known]] == points[known]
+        return np.where(known, cols, -1)
+
+    def candidates(self, query: str, cutoff: float = 60, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Row positions (out of rows, default all) that may satisfy
+        fuzz.partial_ratio(query, name) >= cutoff.
+
+        With s the shorter string (length L) and C the size of the character multiset
+        intersection of the two strings, any alignment partial_ratio considers shares at most
+        C characters with s, so the score is bounded by 200 * C / (L + C). Rows where that
+        bound is below the cutoff are dropped; every other row is returned.
+        """
+        if rows is None:
+            rows = np.arange(len(self.names_lower))
+        if not query or len(query) > self.MAX_FILTER_QUERY:
+            return rows
+        cols = self._query_chars(query)
+        cols, query_counts = np.unique(cols[cols >= 0], return_counts=True)
+        common = np.minimum(self.counts[rows[:, None], cols], query_counts).sum(axis=1)
+        shorter = np.minimum(self.lengths[rows], len(query))
+        # Small slack so a float cutoff taken from a previous score never prunes a tie
+        keep = 200 * common >= (cutoff - 1e-6) * (shorter + common)
+        return rows[keep]
+
+    def trigram_overlap(self, query: str) -> np.ndarray:
+        """Number of distinct query trigrams each row's name contains."""
+        n = len(self.names_lower)
+        cols = self._query_chars(query)
+        a = len(self.alphabet)
+        shared = np.zeros(n, dtype=np.int64)
+        if len(cols) < 3:
+            return shared
+        valid = (cols[:-2] >= 0) & (cols[1:-1] >= 0) & (cols[2:] >= 0)
+        trigrams = np.unique(((cols[:-2] * a + cols[1:-1]) * a + cols[2:])[valid])
+        slots = np.searchsorted(self._tri_codes, trigrams)
+        for slot, code in zip(slots.tolist(), trigrams.tolist()):
+            if slot < len(self._tri_codes) and self._tri_codes[slot] == code:
+                shared[self._tri_rows[self._tri_starts[slot]:self._tri_starts[slot + 1]]] += 1
+        return shared
+
+    def best_match(self, query: str, cutoff: float = 60, seeds: int = 32) -> Optional[Tuple[int, float]]:
+        """
+        (position, score) of the first row with the highest fuzz.partial_ratio, or None if no
+        row reaches cutoff. Rows sharing the most trigrams are scored first; their best score
+        raises the cutoff for the provable candidates() filter, which then bounds the rest.
+        """
+        n = len(self.names_lower)
+        if n == 0:
+            return None
+        shared = self.trigram_overlap(query)
+        k = min(seeds, n)
+        seed_rows = np.argpartition(-shared, k - 1)[:k]
+        names = self.names_lower
+        best = batch_scores(fuzz.partial_ratio, query, [names[pos] for pos in seed_rows.tolist()], cutoff).max()
+
+        rows = self.candidates(query, max(cutoff, best))
+        if not len(rows):
+            return None
+        scores = batch_scores(fuzz.partial_ratio, query, [names[pos] for pos in rows.tolist()], cutoff)
+        # argmax keeps the first row on ties, like the strict > of a linear scan
+        best_at = int(np.argmax(scores))
+        if scores[best_at] < cutoff:
+            return None
+        return int(rows[best_at]), float(scores[best_at])
+
+
+class CatalogIndex:
+    """
+    Resident, column-oriented copy of the products table.
+
+    Numeric columns live in typed arrays, brand/category/color are interned codes and
+    features are kept both as per-row tag codes (to rebuild the original list) and as a
+    tag bitset (for filtering). Rows are only turned back into dicts once they survive
+    filtering, via materialize().
+    """
+
+    def __init__(self, version: int = 0):
+        self.version = version
+
+        self.ids = array("q")
+        self.names: List[str] = []
+        self.names_lower: List[str] = []
+        self.price = array("d")
+        self.rating = array("d")
+        self.stock = array("q")
+        self.images: List[Optional[str]] = []
+
+        self.categories = Vocabulary()
+        self.brands = Vocabulary()
+        self.colors = Vocabulary()
+        self.tags = Vocabulary()
+        self.category_codes = array("i")
+        self.brand_codes = array("i")
+        self.color_codes = array("i")
+
+        self.feature_codes: List[tuple] = []
+        self.feature_bits: List[int] = []
+
+        self._pos_by_id: Dict[int, int] = {}
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._name_index: Optional[NameIndex] = None
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any], version: int = 0) -> "CatalogIndex":
+        """Build from product rows (mappings with the Product column names, features as a list of tags)."""
+        index = cls(version)
+        for row in rows:
+            index._append(row)
+        return index
+
+    def _append(self, row):
+        pos = len(self.ids)
+        self.ids.append(row["id"])
+        name = row["name"] or ""
+        self.names.append(name)
+        self.names_lower.append(name.lower())
+        self.price.append(row["price"])
+        self.rating.append(row["rating"])
+        self.stock.append(row["stock"])
+        self.images.append(row["image"])
+
+        self.category_codes.append(self.categories.intern(row["category"]))
+        self.brand_codes.append(self.brands.intern(row["brand"]))
+        self.color_codes.append(self.colors.intern(row["color"]))
+
+        codes = tuple(self.tags.intern(f) for f in row["features"] or ())
+        bits = 0
+        for c in codes:
+            bits |= 1 << c
+        self.feature_codes.append(codes)
+        self.feature_bits.append(bits)
+
+        self._pos_by_id[row["id"]] = pos
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def position(self, pid: int) -> Optional[int]:
+        return self._pos_by_id.get(pid)
+
+    def update_stock(self, stock: Dict[int, int], version: int) -> bool:
+        """
+        Apply {product_id: new_stock} in place and move the index to version. Returns False,
+        leaving the index stale so it gets rebuilt, if any product id is unknown.
+        """
+        positions = [self.position(pid) for pid in stock]
+        if None in positions:
+            return False
+        for pos, value in zip(positions, stock.values()):
+            self.stock[pos] = value
+        self.version = version
+        return True
+
+    def materialize(self, pos: int) -> Dict[str, Any]:
+        """Rebuild the row as the dict SQLProductStore.list_products() would return."""
+        tag_values = self.tags.values
+        features = [tag_values[c] for c in self.feature_codes[pos]]
+        return {
+            "id": self.ids[pos],
+            "name": self.names[pos],
+            "category": self.categories.values[self.category_codes[pos]],
+            "brand": self.brands.values[self.brand_codes[pos]],
+            "price": self.price[pos],
+            "color": self.colors.values[self.color_codes[pos]],
+            "features": features,
+            "rating": self.rating[pos],
+            "stock": self.stock[pos],
+            "image": self.images[pos],
+        }
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """NumPy views over the typed-array columns, plus the feature bitset as uint64 words."""
+        if self._columns is None:
+            n_words = max(1, (len(self.tags) + 63) // 64)
+            words = np.zeros((len(self), n_words), dtype=np.uint64)
+            for pos, bits in enumerate(self.feature_bits):
+                w = 0
+                while bits:
+                    words[pos, w] = bits & 0xFFFFFFFFFFFFFFFF
+                    bits >>= 64
+                    w += 1
+            self._columns = {
+                "price": np.frombuffer(self.price, dtype=np.float64),
+                "rating": np.frombuffer(self.rating, dtype=np.float64),
+                "stock": np.frombuffer(self.stock, dtype=np.int64),
+                "category": np.frombuffer(self.category_codes, dtype=np.int32),
+                "brand": np.frombuffer(self.brand_codes, dtype=np.int32),
+                "color": np.frombuffer(self.color_codes, dtype=np.int32),
+                "features": words,
+            }
+        return self._columns
+
+    def postings(self, key: str, codes) -> List[np.ndarray]:
+        """Posting lists (ascending row positions) for the given codes of a "category", "brand" or "color" column."""
+        if key not in self._postings:
+            column = self.columns()[key]
+            order = np.argsort(column, kind="stable")
+            bounds = np.searchsorted(column[order], np.arange(int(column.max(initial=-1)) + 2))
+            self._postings[key] = (order, bounds)
+        order, bounds = self._postings[key]
+        return [order[bounds[c]:bounds[c + 1]] for c in codes if c + 1 < len(bounds)]
+
+    def name_index(self) -> NameIndex:
+        if self._name_index is None:
+            self._name_index = NameIndex(self.names_lower)
+        return self._name_index
+
+    def search(
+        self,
+        name: str = None,
+        category: str = None,
+        max_price: int = None,
+        brand: str = None,
+        color: str = None,
+        features: List[str] = None,
+        k: Optional[int] = None,
+        query: str = None,
+        candidates: Optional[Iterable[int]] = None,
+        candidate_scores: Optional[Dict[int, float]] = None,
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray], np.ndarray, int]:
+        """
+        Filter and score the catalog block by block, keeping only the best k rows.
+
+        For full-text mode, candidates (product ids from a first-stage retrieval) restricts
+        the rows searched, and query replaces name: its query_similarity() to each candidate's
+        search_text() must reach QUERY_CUTOFF and is scored as _name_similarity. For semantic
+        mode, candidate_scores ({id: similarity} from the first stage) is scored as
+        _name_similarity as is, with no cutoff.
+
+        Returns (positions, similarities, scores, total_found): the best k row positions in
+        ranking order (all matches when k is None), the per-filter similarity vectors and the
+        _score vector aligned with them, and the number of rows that matched. The score is
+        accumulated in the same order as the original per-row loop, so values and tie order
+        are identical to a stable sort of the full match list.
+        """
+        features = features or []
+        cols = self.columns()
+
+        # Generator pipeline: a source of candidate blocks, one stage per filter, then ranking.
+        # Each block only ever holds SEARCH_BLOCK rows, and ranking keeps at most k of them.
+        vocab_filters = [
+            (key, vocab.match(query.lower(), 70))
+            for key, query, vocab in (
+                ("category", category, self.categories),
+                ("brand", brand, self.brands),
+                ("color", color, self.colors),
+            )
+            if query
+        ]
+        if candidates is not None:
+            positions = sorted(pos for pos in map(self.position, candidates) if pos is not None)
+            blocks = self._posting_blocks([np.array(positions, dtype=np.int64)])
+        elif vocab_filters:
+            # The first attribute's posting lists drive the scan; the others filter its blocks
+            key, table = vocab_filters[0]
+            blocks = self._posting_blocks(self.postings(key, np.flatnonzero(table >= 70).tolist()))
+        else:
+            blocks = self._range_blocks()
+        for key, table in vocab_filters:
+            blocks = _vocab_stage(blocks, cols[key], table, f"_{key}_similarity")
+        if max_price:
+            blocks = _price_stage(blocks, cols["price"], max_price)
+        if features:
+            blocks = _features_stage(blocks, cols["features"], [self.tags.code(f) for f in features])
+        if name:
+            blocks = _name_stage(blocks, self.name_index(), name.lower())
+        elif candidate_scores is not None:
+            blocks = _scores_stage(blocks, self, candidate_scores)
+        elif query:
+            blocks = _query_stage(blocks, self, query.lower())
+        return self._rank(blocks, k)
+
+    def _range_blocks(self) -> Iterator["_Block"]:
+        for start in range(0, len(self), SEARCH_BLOCK):
+            yield _Block(np.arange(start, min(start + SEARCH_BLOCK, len(self))))
+
+    def _posting_blocks(self, postings: List[np.ndarray]) -> Iterator["_Block"]:
+        """Merge posting lists into ascending blocks of row positions, one position range at a time."""
+        for start in range(0, len(self), SEARCH_BLOCK):
+            end = start + SEARCH_BLOCK
+            parts = [p[np.searchsorted(p, start):np.searchsorted(p, end)] for p in postings]
+            positions = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+            if len(positions):
+                yield _Block(np.sort(positions) if len(parts) > 1 else positions)
+
+    def _rank(self, blocks: Iterable["_Block"], k: Optional[int]) -> Tuple[np.ndarray, Dict[str, np.ndarray], np.ndarray, int]:
+        """
+        Score each block and keep the best k rows in a bounded min-heap keyed on
+        (score, -position), i.e. the same order a stable descending sort would produce.
+        """
+        cols = self.columns()
+        heap: List[tuple] = []
+        # Without a k there is nothing to bound: blocks are kept whole and sorted once at the end
+        kept: List[Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]] = []
+        total_found = 0
+        sim_keys: List[str] = []
+        for block in blocks:
+            if not len(block.positions):
+                continue
+            total_found += len(block.positions)
+            sim_keys = [key for key, _ in SIMILARITY_WEIGHTS if key in block.sims]
+
+            # Scoring system
+            score = cols["rating"][block.positions] * 20
+            for key, weight in SIMILARITY_WEIGHTS:
+                if key in block.sims:
+                    score += block.sims[key] * weight
+            score += 10 * block.feature_hits
+            stock = cols["stock"][block.positions]
+            score -= np.where(stock == 0, 50, np.where(stock < 3, 20, 0))
+
+            if k is None:
+                kept.append((block.positions, score, block.sims))
+                continue
+
+            # Only the block's own top k can make it into the overall top k
+            top = _top_k(score, k)
+            rows = zip(score[top].tolist(), block.positions[top].tolist(),
+                       *(block.sims[key][top].tolist() for key in sim_keys))
+            for row_score, pos, *row_sims in rows:
+                item = (row_score, -pos, row_sims)
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, item)
+                else:
+                    # Block rows arrive best first, so nothing after this one can get in either
+                    break
+
+        if k is None:
+            positions = np.concatenate([p for p, _, _ in kept]) if kept else np.zeros(0, dtype=np.int64)
+            scores = np.concatenate([s for _, s, _ in kept]) if kept else np.zeros(0)
+            order = _top_k(scores, None)
+            sims = {key: np.concatenate([b[key] for _, _, b in kept])[order] for key in sim_keys}
+            return positions[order], sims, scores[order], total_found
+
+        ranked = sorted(heap, key=lambda item: (-item[0], -item[1]))
+        positions = np.array([-item[1] for item in ranked], dtype=np.int64)
+        scores = np.array([item[0] for item in ranked], dtype=np.float64)
+        sims = {key: np.array([item[2][i] for item in ranked], dtype=np.float64) for i, key in enumerate(sim_keys)}
+        return positions, sims, scores, total_found
+
+
+# Rows per block in CatalogIndex.search's pipeline
+SEARCH_BLOCK = 65536
+
+# Full-text mode: trigram recall is loose (a shared "ing" is a match), so candidates whose
+# query_similarity() is below this are dropped before ranking
+QUERY_CUTOFF = 60
+
+_WORD = re.compile(r"[\w-]+")
+
+
+class _Block:
+    """A run of candidate rows (ascending positions) with per-row values gathered by the stages so far."""
+
+    __slots__ = ("positions", "sims", "feature_hits")
+
+    def __init__(self, positions: np.ndarray):
+        self.positions = positions
+        self.sims: Dict[str, np.ndarray] = {}
+        self.feature_hits = np.zeros(len(positions), dtype=np.int64)
+
+    def keep(self, mask: np.ndarray) -> "_Block":
+        self.positions = self.positions[mask]
+        self.sims = {key: sim[mask] for key, sim in self.sims.items()}
+        self.feature_hits = self.feature_hits[mask]
+        return self
+
+
+def _vocab_stage(blocks, codes: np.ndarray, table: np.ndarray, sim_key: str):
+    """Fuzzy category/brand/color filter: look up the memoized per-value similarity for each row."""
+    for block in blocks:
+        sim = table[codes[block.positions]]
+        block.sims[sim_key] = sim
+        block.keep(sim >= 70)
+        if len(block.positions):
+            yield block
+
+
+def _price_stage(blocks, price: np.ndarray, max_price):
+    for block in blocks:
+        block.keep(price[block.positions] <= max_price)
+        if len(block.positions):
+            yield block
+
+
+def _features_stage(blocks, words: np.ndarray, codes: List[Optional[int]]):
+    """A row matches if any requested tag bit is set; every requested tag it has adds a hit."""
+    for block in blocks:
+        block_words = words[block.positions]
+        for code in codes:
+            if code is not None:
+                block.feature_hits += ((block_words[:, code // 64] >> np.uint64(code % 64)) & np.uint64(1)).astype(np.int64)
+        block.keep(block.feature_hits > 0)
+        if len(block.positions):
+            yield block
+
+
+def _name_stage(blocks, name_index: "NameIndex", name_lower: str):
+    """Fuzzy name filter: only rows the n-gram index cannot rule out get scored."""
+    names_lower = name_index.names_lower
+    for block in blocks:
+        rows = name_index.candidates(name_lower, 60, block.positions)
+        sim = np.zeros(len(block.positions))
+        sim[np.searchsorted(block.positions, rows)] = batch_scores(
+            fuzz.partial_ratio, name_lower, [names_lower[pos] for pos in rows.tolist()], 60)
+        block.sims["_name_similarity"] = sim
+        block.keep(sim >= 60)
+        if len(block.positions):
+            yield block
+
+
+def search_text(name: Optional[str], brand: Optional[str], category: Optional[str], tags: Iterable[str]) -> str:
+    """The lowercased text a full-text query is scored against: name, brand, category and feature tags."""
+    return " ".join([name or "", brand or "", category or "", *tags]).lower()
+
+
+def query_words(query_lower: str) -> List[str]:
+    """The distinct words of 3+ characters in a lowercased free-text query."""
+    return list(dict.fromkeys(w for w in _WORD.findall(query_lower) if len(w) >= 3))
+
+
+def query_similarity(query_lower: str, texts: List[str]) -> np.ndarray:
+    """
+    How well each search_text() matches a free-text query, 0-100: the better of fuzz.WRatio
+    of the whole query against the text and, per query word, the best fuzz.ratio against a
+    word of the text, averaged over the query words. The per-word score is what a misspelt
+    word reaches ("galxy" scores 91 against "galaxy"); against the whole text it is drowned
+    out by the other words. Scores below QUERY_CUTOFF come back as 0.
+    """
+    whole = batch_scores(fuzz.WRatio, query_lower, texts, QUERY_CUTOFF)
+    words = query_words(query_lower)
+    if not words or not texts:
+        return whole
+    text_words = [_WORD.findall(text) for text in texts]
+    vocab = {w: i for i, w in enumerate(dict.fromkeys(chain.from_iterable(text_words)))}
+    if not vocab:
+        return whole
+    # Every query word against every distinct text word, once
+    pair = process.cdist(words, list(vocab), scorer=fuzz.ratio, workers=-1, dtype=np.float64)
+    per_word = np.array([pair[:, [vocab[w] for w in ws]].max(axis=1).mean() if ws else 0.0
+                         for ws in text_words])
+    per_word[per_word < QUERY_CUTOFF] = 0.0
+    return np.maximum(whole, per_word)
+
+
+def _query_stage(blocks, index: "CatalogIndex", query_lower: str):
+    """Full-text mode: query_similarity() of the query against each candidate's search_text()."""
+    tag_values = index.tags.values
+    for block in blocks:
+        texts = [search_text(index.names[pos], index.brands.values[index.brand_codes[pos]],
+                             index.categories.values[index.category_codes[pos]],
+                             (tag_values[c] for c in index.feature_codes[pos]))
+                 for pos in block.positions.tolist()]
+        sim = query_similarity(query_lower, texts)
+        block.sims["_name_similarity"] = sim
+        block.keep(sim >= QUERY_CUTOFF)
+        if len(block.positions):
+            yield block
+
+
+def _scores_stage(blocks, index: "CatalogIndex", scores: Dict[int, float]):
+    """Semantic mode: the first stage's similarity for each candidate (rows it did not return score 0)."""
+    ids = index.ids
+    for block in blocks:
+        block.sims["_name_similarity"] = np.array([scores.get(ids[pos], 0.0) for pos in block.positions.tolist()],
+                                                  dtype=np.float64)
+        yield block
+
+
+def batch_scores(scorer, query: str, choices: List[str], cutoff: float) -> np.ndarray:
+    """
+    scorer(query, choice) for every choice via rapidfuzz.process.cdist, in native code on all
+    cores. Scores below cutoff come back as 0. The choices are laid out as cdist's query axis
+    (which is what it splits across workers); ratio and partial_ratio are symmetric, so the
+    values are the same as the one-pair-at-a-time calls.
+    """
+    if not choices:
+        return np.zeros(0)
+    return process.cdist(choices, [query], scorer=scorer, score_cutoff=cutoff, workers=-1, dtype=np.float64)[:, 0]
+
+
+def _sorted_unique(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted distinct values and their counts (sort-based; np.unique's hash path is slower here)."""
+    values = np.sort(values)
+    if not len(values):
+        return values, np.zeros(0, dtype=np.int64)
+    first = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+    return values[first], np.diff(np.append(first, len(values)))
+
+
+def _top_k(score: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first, ties broken by position exactly like a
+    stable descending sort. Uses argpartition so only the k survivors get sorted.
+    """
+    if k is None or k >= len(score):
+        return np.argsort(-score, kind="stable")
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    part = np.argpartition(-score, k - 1)[:k]
+    kth = score[part].min()
+    # Rows tied with the k-th score must resolve to the earliest ones, as a stable sort would
+    above = np.flatnonzero(score > kth)
+    ties = np.flatnonzero(score == kth)[: k - len(above)]
+    top = np.concatenate([above, ties])
+    return top[np.argsort(-score[top], kind="stable")]
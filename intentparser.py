@@ -0,0 +1,187 @@
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple, Iterable, Iterator
+import threading
+import weakref
+
+# Curated synonyms; catalog categories are also recognised by their own name after these
+CATEGORIES_MAP = {
+    "running shoes": ["shoe", "shoes", "sneaker", "sneakers", "footwear"],
+    "smartphones": ["phone", "smartphone", "mobile", "cell"],
+    "laptops": ["laptop", "notebook", "computer"],
+    "earphones": ["earphone", "earbud", "earbuds", "headset"],
+    "headphones": ["headphone", "headphones"],
+    "tablets": ["tablet", "ipad"],
+    "cameras": ["camera", "dslr"],
+    "wearables": ["watch", "smartwatch", "smart watch", "wearable"]
+}
+
+FEATURES_KEYWORDS = ["cushioned", "lightweight", "battery", "camera", "noise-cancelling",
+                     "wireless", "gaming", "5g", "amoled", "fast charging"]
+
+PRICE_KEYWORD = "under "
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton: reports every occurrence of every keyword in one pass over the text."""
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        for kw in keywords:
+            self._add(kw)
+        self._link()
+
+    def _add(self, keyword: str):
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        if keyword not in self._out[state]:
+            self._out[state].append(keyword)
+
+    def _link(self):
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield (end, keyword) for each occurrence, end being the index just past the match."""
+        state = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for kw in out[state]:
+                yield i + 1, kw
+
+
+class IntentMatcher:
+    """
+    All intent vocabularies compiled into one KeywordAutomaton. Each keyword maps to the
+    intent fields it can set, with a priority that reproduces the list order precedence the
+    per-field substring scans had (first category/color/brand in list order wins).
+    """
+
+    def __init__(self, brands: List[str], colors: List[str], categories: List[str], cache_size: int = 1024):
+        self.vocabulary = (tuple(brands), tuple(colors), tuple(categories))
+        self._targets: Dict[str, List[Tuple[str, int, str]]] = {}
+
+        category_keywords = list(CATEGORIES_MAP.items())
+        category_keywords += [(c, [c]) for c in categories if c not in CATEGORIES_MAP]
+        for priority, (category, keywords) in enumerate(category_keywords):
+            # The category's own name is a keyword too, so "running shoes" is covered as one phrase
+            singular = category[:-1] if category.endswith("s") and not category.endswith("ies") else category
+            for kw in (category, singular, *keywords):
+                self._target(kw, "category", priority, category)
+        for priority, c in enumerate(colors):
+            self._target(c, "color", priority, c)
+        for priority, b in enumerate(brands):
+            self._target(b, "brand", priority, b)
+        for priority, f in enumerate(FEATURES_KEYWORDS):
+            self._target(f, "features", priority, f)
+            self._target(f.replace("-", " "), "features", priority, f)
+        self._target(PRICE_KEYWORD, "max_price", 0, None)
+
+        self._automaton = KeywordAutomaton(self._targets)
+        self.parse = lru_cache(maxsize=cache_size)(self._parse)
+
+    def uncovered(self, q: str) -> List[str]:
+        """Words of q not accounted for by any keyword (or by the number after the price keyword)."""
+        covered = bytearray(len(q))
+        for end, kw in self._automaton.iter_matches(q):
+            start = end - len(kw)
+            if kw == PRICE_KEYWORD:
+                while end < len(q) and q[end].isdecimal():
+                    end += 1
+            covered[start:end] = b"\x01" * (end - start)
+        rest = "".join(" " if covered[i] else ch for i, ch in enumerate(q))
+        return [w for w in (w.strip(".,!?;:'\"") for w in rest.split()) if w]
+
+    def _target(self, keyword: str, field: str, priority: int, value):
+        targets = self._targets.setdefault(keyword, [])
+        if (field, priority, value) not in targets:
+            targets.append((field, priority, value))
+
+    def _parse(self, q: str) -> Dict[str, Any]:
+        best: Dict[str, Tuple[int, str]] = {}
+        features = {}
+        max_price = None
+        for end, kw in self._automaton.iter_matches(q):
+            for field, priority, value in self._targets[kw]:
+                if field == "features":
+                    features[priority] = value
+                elif field == "max_price":
+                    if max_price is None:
+                        digits = end
+                        while digits < len(q) and q[digits].isdecimal():
+                            digits += 1
+                        if digits > end:
+                            max_price = int(q[end:digits])
+                elif field not in best or priority < best[field][0]:
+                    best[field] = (priority, value)
+        return {
+            "category": best["category"][1] if "category" in best else None,
+            "max_price": max_price,
+            "brand": best["brand"][1] if "brand" in best else None,
+            "color": best["color"][1] if "color" in best else None,
+            "features": [features[p] for p in sorted(features)],
+        }
+
+
+_matcher: IntentMatcher = None
+_matcher_index = None
+_matcher_lock = threading.Lock()
+
+
+def _catalog_values(vocab) -> Tuple[str, ...]:
+    """Distinct non-empty lowercased values, in first-seen catalog order."""
+    return tuple(dict.fromkeys(v for v in vocab.lowered if v))
+
+
+def matcher_for(index) -> IntentMatcher:
+    """
+    The compiled matcher for the catalog's brand/color/category vocabulary. It is only
+    recompiled (dropping its memo) when a rebuilt index actually has a different vocabulary.
+    """
+    global _matcher, _matcher_index
+    with _matcher_lock:
+        if _matcher_index is not None and _matcher_index() is index:
+            return _matcher
+        vocabulary = (
+            _catalog_values(index.brands),
+            _catalog_values(index.colors),
+            _catalog_values(index.categories),
+        )
+        if _matcher is None or _matcher.vocabulary != vocabulary:
+            _matcher = IntentMatcher(*vocabulary)
+        _matcher_index = weakref.ref(index)
+        return _matcher
+
+
+def parse(query: str, index) -> Dict[str, Any]:
+    """Extract category, max_price, brand, color and features from a query in one pass (memoized)."""
+    normalized = " ".join(query.lower().split())
+    intent = matcher_for(index).parse(normalized)
+    # Callers get their own copy; the memoized result is shared
+    return {**intent, "features": list(intent["features"])}
+
+
+def uncovered_words(query: str, index) -> List[str]:
+    """The words of a query that parse() did not recognise as a category, brand, color, feature or price."""
+    normalized = " ".join(query.lower().split())
+    return matcher_for(index).uncovered(normalized)
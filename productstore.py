@@ -1,9 +1,19 @@
 from datetime import datetime
-from typing import Dict, Any, List, Optional
-from baseClass import Base, Product, Order
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy.exc import SQLAlchemyError
+from typing import Dict, Any, List, Optional, Tuple, Callable, Iterable
+from baseClass import Base, Product, ProductFeature, Order
+from catalogindex import (
+    CatalogIndex, Vocabulary, SIMILARITY_WEIGHTS, QUERY_CUTOFF, batch_scores, query_similarity, query_words,
+    search_text, _top_k,
+)
+from semanticindex import SemanticIndex, load_embedder
+from sqlalchemy import create_engine, select, func, event, update, insert, bindparam, null, case, text, DateTime, Enum
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, sessionmaker, joinedload, lazyload
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.exc import SQLAlchemyError, OperationalError
+from rapidfuzz import fuzz
+import numpy as np
+import threading
 import json
 
 SEED_PRODUCTS = [
@@ -190,17 +200,380 @@ SEED_PRODUCTS = [
 ]
 
 
+# Engine settings for shopgenie.db. WAL lets catalog reads proceed while an order commits
+# (readers never wait on the writer); NORMAL sync is durable in WAL mode except on power
+# loss; busy_timeout makes a second writer wait for the lock instead of failing with
+# "database is locked". The pool keeps one connection per concurrent Streamlit/tool thread.
+SQLITE_ENGINE_PROFILE = {
+    "pragmas": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,        # ms
+        "cache_size": -65536,        # KiB (64 MiB) per connection
+        "mmap_size": 268435456,      # bytes (256 MiB)
+        "temp_store": "MEMORY",
+    },
+    "pool_size": 10,
+    "max_overflow": 20,
+    "pool_timeout": 30,
+}
+
+
+def apply_sqlite_pragmas(engine, pragmas: Dict[str, Any]):
+    """Run the PRAGMAs on every new DBAPI connection of a (sync or async) SQLite engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if sync_engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def _order_statements():
+    """
+    Core statements for place_order, built once: the conditional stock decrement that takes
+    qty units only if that many are left, the user upsert and the order insert.
+    """
+    from baseClass import User
+    products, orders = Product.__table__, Order.__table__
+    reserve = (update(products)
+               .where(products.c.id == bindparam("pid"), products.c.stock >= bindparam("qty"))
+               .values(stock=products.c.stock - bindparam("qty"))
+               .returning(products.c.stock, products.c.price, products.c.name))
+    stock = select(products.c.stock).where(products.c.id == bindparam("pid"))
+    upsert_user = sqlite_insert(User.__table__).on_conflict_do_nothing(index_elements=["user_id"])
+    insert_order = insert(orders).returning(orders.c.order_id, sort_by_parameter_order=True)
+    # The conditional decrement for a whole cart, passed as one JSON [[pid, qty], ...] parameter:
+    # only products that can fill their line come back, so a short result means a failed line
+    cart_rows = func.json_each(bindparam("cart")).table_valued("value")
+    cart = select(func.json_extract(cart_rows.c.value, "$[0]").label("pid"),
+                  func.json_extract(cart_rows.c.value, "$[1]").label("qty")).subquery("cart")
+    reserve_cart = (update(products)
+                    .where(products.c.id == cart.c.pid, products.c.stock >= cart.c.qty)
+                    .values(stock=products.c.stock - cart.c.qty)
+                    .returning(products.c.id, products.c.stock, products.c.price, products.c.name))
+    return reserve, stock, upsert_user, insert_order, reserve_cart
+
+
+RESERVE_STOCK, PRODUCT_STOCK, UPSERT_USER, INSERT_ORDER, RESERVE_CART = _order_statements()
+
+
+def _order_values(user_id: str, pid: int, qty: int, price: float) -> Dict[str, Any]:
+    from baseClass import OrderStatus
+    now = datetime.utcnow()
+    # SQLite returns whole REAL values through RETURNING as ints
+    return {"user_id": user_id, "product_id": pid, "quantity": qty, "total_price": float(price) * qty,
+            "status": OrderStatus.CONFIRMED, "created_at": now, "updated_at": now}
+
+
+def _order_dict(order_id: int, values: Dict[str, Any], product_name: str) -> Dict[str, Any]:
+    """The inserted Order's columns as RowSerializer would give them, plus display fields."""
+    return {
+        "order_id": order_id,
+        "user_id": values["user_id"],
+        "product_id": values["product_id"],
+        "quantity": values["quantity"],
+        "total_price": values["total_price"],
+        "status": values["status"].value,
+        "created_at": values["created_at"].isoformat(),
+        "updated_at": values["updated_at"].isoformat(),
+        # Format order with Rs. prefix
+        "total_price_formatted": f"Rs. {values['total_price']}",
+        "product_name": product_name,
+    }
+
+
+class _OrderRejected(Exception):
+    """Raised inside a bulk order transaction to roll back every line placed so far."""
+
+
+def _cart_error(items: List[Tuple[int, int]]) -> Optional[str]:
+    if not items:
+        return "Cart is empty."
+    if any(qty < 1 for _, qty in items):
+        return "Quantities must be at least 1."
+    return None
+
+
+def _cart_totals(items: List[Tuple[int, int]]) -> Dict[int, int]:
+    """Quantity per product, summing lines that repeat a product, in first-seen order."""
+    totals: Dict[int, int] = {}
+    for pid, qty in items:
+        totals[pid] = totals.get(pid, 0) + qty
+    return totals
+
+
+def _rejected_line(pid: int, qty: int, stock: Optional[int], name: Optional[str]) -> str:
+    if stock is None:
+        return f"Product {pid} not found."
+    return f"Only {stock} of {name} left in stock (requested {qty})."
+
+
+def _column_converter(column) -> Optional[Callable[[Any], Any]]:
+    """How a column's Python value becomes JSON-friendly: datetimes to ISO strings, enums to their value."""
+    if isinstance(column.type, DateTime):
+        return datetime.isoformat
+    if isinstance(column.type, Enum) and column.type.enum_class is not None:
+        return lambda member: member.value
+    return None
+
+
+class RowSerializer:
+    """
+    Row-to-dict conversion compiled once per column list. Column names are zipped onto the
+    Core row tuple and only the DateTime/Enum columns get a converter, so a row costs one
+    dict() call instead of a getattr and isinstance checks per column.
+    """
+
+    def __init__(self, columns: Iterable[Any]):
+        self.columns = list(columns)
+        self.names = tuple(c.name for c in self.columns)
+        self.converters = tuple((c.name, f) for c in self.columns for f in [_column_converter(c)] if f)
+
+    def __call__(self, row) -> Dict[str, Any]:
+        out = dict(zip(self.names, row))
+        for name, convert in self.converters:
+            value = out[name]
+            if value is not None:
+                out[name] = convert(value)
+        return out
+
+
+# Product rows without the JSON features column; a NULL placeholder keeps "features" in its
+# column position in the dict until the tags from product_features are filled in
+PRODUCT_ROW = RowSerializer(null().label("features") if c.name == "features" else c
+                            for c in Product.__table__.c)
+PRODUCT_ROWS = select(*PRODUCT_ROW.columns).order_by(Product.id)
+FEATURE_ROWS = (select(ProductFeature.product_id, ProductFeature.tag)
+                .order_by(ProductFeature.product_id, ProductFeature.position))
+
+
+# Columns search_products() matches fuzzy terms against by their distinct values
+SEARCH_VOCABULARY_COLUMNS = ("category", "brand", "color")
+
+
+# Optional full-text index over product name, brand, category and feature tags. The trigram tokenizer
+# matches any 3-character substring, so prefixes and misspelt words still share most of
+# their trigrams with the indexed text. Triggers keep it in step with products and
+# product_features; stock updates do not touch it.
+FTS_TAGS = "(SELECT group_concat(tag, ' ') FROM product_features WHERE product_id = {pid})"
+FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE products_fts USING fts5(name, brand, category, tags, tokenize='trigram')",
+    """CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, brand, category, tags) VALUES (new.id, new.name, new.brand, new.category, '');
+    END""",
+    """CREATE TRIGGER products_fts_update AFTER UPDATE OF name, brand, category ON products BEGIN
+        UPDATE products_fts SET name = new.name, brand = new.brand, category = new.category WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+        DELETE FROM products_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER product_features_fts_insert AFTER INSERT ON product_features BEGIN
+        UPDATE products_fts SET tags = {FTS_TAGS.format(pid="new.product_id")} WHERE rowid = new.product_id;
+    END""",
+    f"""CREATE TRIGGER product_features_fts_update AFTER UPDATE ON product_features BEGIN
+        UPDATE products_fts SET tags = {FTS_TAGS.format(pid="old.product_id")} WHERE rowid = old.product_id;
+        UPDATE products_fts SET tags = {FTS_TAGS.format(pid="new.product_id")} WHERE rowid = new.product_id;
+    END""",
+    f"""CREATE TRIGGER product_features_fts_delete AFTER DELETE ON product_features BEGIN
+        UPDATE products_fts SET tags = {FTS_TAGS.format(pid="old.product_id")} WHERE rowid = old.product_id;
+    END""",
+    f"""INSERT INTO products_fts(rowid, name, brand, category, tags)
+        SELECT id, name, brand, category, {FTS_TAGS.format(pid="products.id")} FROM products""",
+]
+# bm25 column weights (name, brand, category, tags) and the statement ranking products for a
+# MATCH expression; _matches is the full match count, computed before the LIMIT
+FTS_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+FTS_SEARCH = text(
+    f"SELECT rowid, count(*) OVER () AS _matches FROM ("
+    f"SELECT rowid, bm25(products_fts, {', '.join(map(str, FTS_WEIGHTS))}) AS rank "
+    f"FROM products_fts WHERE products_fts MATCH :match) ORDER BY rank, rowid LIMIT :limit"
+)
+
+
+def fts_match(query: str) -> List[str]:
+    """
+    FTS5 MATCH expressions for a free-text query, strictest first. A quoted word is a
+    substring match (all of its trigrams, in order), so the tiers are: every word, any word,
+    then any trigram of any word, which still finds misspelt words ("galxy"). Empty when no
+    word has 3 characters.
+    """
+    words = query_words(query.lower())
+    if not words:
+        return []
+    phrases = [f'"{w}"' for w in words]
+    trigrams = dict.fromkeys(f'"{w[i:i + 3]}"' for w in words for i in range(len(w) - 2))
+    tiers = [" AND ".join(phrases), " OR ".join(phrases), " OR ".join(trigrams)]
+    return list(dict.fromkeys(tiers))
+
+
+# Cosine below which a semantic neighbour is unrelated noise (a shared trigram or common word)
+SEMANTIC_MIN_SIMILARITY = 0.2
+
+
+def _feature_lists(rows) -> Dict[int, List[str]]:
+    """{product_id: [tag, ...]} in each product's tag order, from FEATURE_ROWS results."""
+    tags: Dict[int, List[str]] = {}
+    for pid, tag in rows:
+        tags.setdefault(pid, []).append(tag)
+    return tags
+
+
+def _product_dicts(rows, tags: Dict[int, List[str]]) -> List[Dict[str, Any]]:
+    """PRODUCT_ROWS results as the dicts list_products() returns."""
+    out = []
+    for row in rows:
+        product = PRODUCT_ROW(row)
+        product["features"] = tags.get(product["id"], [])
+        out.append(product)
+    return out
+
+
+def _engine_options(db_url: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Pool arguments from a profile; in-memory databases keep SQLAlchemy's default pool."""
+    if ":memory:" in db_url or db_url.rstrip("/").endswith(":"):
+        return {}
+    return {k: profile[k] for k in ("pool_size", "max_overflow", "pool_timeout") if k in profile}
+
+
+# Order.to_dict() only reads the product's name: join the product into the order SELECT and
+# skip its selectin-loaded feature tags, so an order lookup stays a single statement
+ORDER_PRODUCT = joinedload(Order.product).options(lazyload(Product.feature_tags))
+
 
 class SQLProductStore:
-    def __init__(self, db_url: str = "sqlite:///shopgenie.db", seed_data: Optional[List[Dict[str, Any]]] = None):
-        self.engine = create_engine(db_url, echo=False, future=True)
+    def __init__(self, db_url: str = "sqlite:///shopgenie.db", seed_data: Optional[List[Dict[str, Any]]] = None,
+                 engine_profile: Optional[Dict[str, Any]] = None, full_text: bool = True):
+        profile = SQLITE_ENGINE_PROFILE if engine_profile is None else engine_profile
+        self.engine = create_engine(db_url, echo=False, future=True, **_engine_options(db_url, profile))
+        apply_sqlite_pragmas(self.engine, profile.get("pragmas"))
         self.SessionLocal = sessionmaker(bind=self.engine, expire_on_commit=False)
+        # Bumped on every write to the products table; the catalog index is rebuilt when it moves
+        self.catalog_version = 0
+        self._catalog_index: Optional[CatalogIndex] = None
+        self._index_lock = threading.Lock()
+        # Bumped on every product write other than a stock-only one; what is derived from the
+        # catalog's text (search vocabularies, semantic index) is rebuilt when it moves
+        self._content_epoch = 0
+        # Distinct category/brand/color values for search_products()
+        self._vocabularies: Optional[Dict[str, Vocabulary]] = None
+        # Product embeddings for semantic_search(), memory-mapped next to a database file
+        self._semantic_index: Optional[SemanticIndex] = None
+        self._semantic_epoch = -1
+        self._semantic_lock = threading.Lock()
+        # HashingEmbedder, or the local model named by $SHOPGENIE_EMBEDDING_MODEL; loaded on first use
+        self._embedder = None
+        database = self.engine.url.database
+        self._vectors_path = f"{database}.vectors" if database and database != ":memory:" else None
         # create tables defined in Base
         Base.metadata.create_all(self.engine)
+        self._create_missing_indexes()
+        self._backfill_product_features()
+        # Set by _create_full_text_index(); False when disabled or SQLite lacks FTS5/trigram
+        self.full_text = full_text and self._create_full_text_index()
         # seed
         if seed_data:
             self._maybe_seed(seed_data)
 
+    def _create_missing_indexes(self):
+        """
+        create_all() skips tables that already exist, so indexes added to the models later
+        are created here for database files made before them.
+        """
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+
+    def _backfill_product_features(self):
+        """
+        Copy the JSON features column into product_features for products that have no tag
+        rows yet (database files made before the table existed). Decodes each row once.
+        """
+        tagged = select(ProductFeature.product_id).where(ProductFeature.product_id == Product.id).exists()
+        with self.engine.begin() as conn:
+            rows = conn.execute(select(Product.id, Product.features).where(~tagged)).all()
+            values = []
+            for pid, features in rows:
+                try:
+                    features = json.loads(features) if features else []
+                except ValueError:
+                    continue
+                if isinstance(features, list):
+                    values += [{"product_id": pid, "position": i, "tag": tag} for i, tag in enumerate(features)]
+            if values:
+                conn.execute(insert(ProductFeature), values)
+
+    def _create_full_text_index(self) -> bool:
+        """Create and fill products_fts with its triggers unless it exists. Returns whether it is usable."""
+        try:
+            with self.engine.begin() as conn:
+                exists = conn.scalar(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"))
+                if not exists:
+                    for statement in FTS_SCHEMA:
+                        conn.execute(text(statement))
+            return True
+        except OperationalError as e:
+            print(f"Full-text search disabled: {e}")
+            return False
+
+    def text_search(self, query: str, limit: int) -> Tuple[List[int], int]:
+        """
+        (ids, matches): up to limit products best matching a free-text query, best first (bm25
+        over name, brand, category and feature tags), and how many products matched in all.
+        Uses the strictest fts_match() tier that matches anything. ([], 0) when full-text
+        search is off or nothing matches.
+        """
+        if not self.full_text:
+            return [], 0
+        try:
+            with self.engine.connect() as conn:
+                for match in fts_match(query):
+                    rows = conn.execute(FTS_SEARCH, {"match": match, "limit": limit}).all()
+                    if rows:
+                        return [pid for pid, _ in rows], rows[0][1]
+        except SQLAlchemyError:
+            pass
+        return [], 0
+
+    def semantic_index(self) -> SemanticIndex:
+        """
+        The product embedding index, rebuilt after a non-stock product write. With a database
+        file its vectors are memory-mapped from <database>.vectors.npy and reused across restarts
+        while the catalog text is unchanged, so only a changed catalog is re-embedded. Categories
+        are passed as labels: the hashing embedder learns its concept features from them.
+        """
+        with self._semantic_lock:
+            with self._index_lock:
+                epoch = self._content_epoch
+            if self._semantic_index is None or self._semantic_epoch != epoch:
+                with self.engine.connect() as conn:
+                    tags = _feature_lists(conn.execute(FEATURE_ROWS))
+                    rows = conn.execute(select(Product.id, Product.name, Product.brand, Product.category)
+                                        .order_by(Product.id)).all()
+                texts = [search_text(name, brand, category, tags.get(pid, [])) for pid, name, brand, category in rows]
+                if self._embedder is None:
+                    self._embedder = load_embedder()
+                self._semantic_index = SemanticIndex.build([r[0] for r in rows], texts, [r[3] for r in rows],
+                                                           self._embedder, self._vectors_path)
+                self._semantic_epoch = epoch
+            return self._semantic_index
+
+    def semantic_search(self, query: str, limit: int) -> Dict[int, float]:
+        """
+        {id: similarity} for up to limit products nearest a free-text query in embedding space,
+        best first, as 100 * cosine (the scale of the fuzzy similarities). Products below
+        SEMANTIC_MIN_SIMILARITY are left out; empty when nothing in the query is recognised.
+        """
+        ids, sims = self.semantic_index().search(query, limit)
+        keep = sims >= SEMANTIC_MIN_SIMILARITY
+        return {pid: 100 * sim for pid, sim in zip(ids[keep].tolist(), sims[keep].tolist())}
+
     def _maybe_seed(self, seed_data: List[Dict[str, Any]]):
         try:
             with Session(self.engine) as ses:
@@ -208,74 +581,298 @@ class SQLProductStore:
                 if count == 0:
                     for p in seed_data:
                         product_data = p.copy()
-                        if 'features' in product_data and isinstance(product_data['features'], list):
-                            product_data['features'] = json.dumps(product_data['features'])
-                        
+                        features = product_data.pop('features', [])
                         obj = Product(**product_data)
+                        obj.set_features(features)
                         ses.add(obj)
                     ses.commit()
+                    self._bump_catalog_version()
         except Exception as e:
             print(f"Error seeding database: {e}")
 
+    def _bump_catalog_version(self, stock: Optional[Dict[int, int]] = None):
+        """
+        Record a write to the products table. Pass stock={pid: new_stock} for writes that only
+        changed stock levels: a current resident index is then patched in place instead of
+        being rebuilt from scratch on the next search. A stock patch must be made inside the
+        writing transaction, before its commit, or concurrent patches can land out of order.
+        """
+        with self._index_lock:
+            self.catalog_version += 1
+            if stock is None:
+                self._content_epoch += 1
+                self._vocabularies = None
+            index = self._catalog_index
+            if stock is not None and index is not None and index.version == self.catalog_version - 1:
+                index.update_stock(stock, self.catalog_version)
+
+    def _discard_stock_patch(self):
+        """A transaction that patched the resident index's stock did not commit: rebuild the index."""
+        with self._index_lock:
+            self.catalog_version += 1
+
+    def catalog_index(self) -> CatalogIndex:
+        """
+        Return the resident catalog index, rebuilding it if the products table changed
+        since it was built. Reads plain Core rows, so no ORM objects are hydrated, and takes
+        features from product_features rather than decoding the JSON column.
+        """
+        with self._index_lock:
+            version = self.catalog_version
+            if self._catalog_index is None or self._catalog_index.version != version:
+                with self.engine.connect() as conn:
+                    tags = _feature_lists(conn.execute(FEATURE_ROWS))
+                    products = _product_dicts(conn.execute(PRODUCT_ROWS), tags)
+                self._catalog_index = CatalogIndex.from_rows(products, version)
+            return self._catalog_index
+
+    def current_catalog_index(self) -> Optional[CatalogIndex]:
+        """The resident catalog index if it matches the current catalog version, else None (never rebuilds)."""
+        with self._index_lock:
+            index = self._catalog_index
+            return index if index is not None and index.version == self.catalog_version else None
+
     def list_products(self) -> List[Dict[str, Any]]:
+        """Every product as a dict, serialized straight from Core rows (no ORM objects)."""
         try:
-            with Session(self.engine) as ses:
-                products = ses.query(Product).all()
-                return [self._model_to_dict(p) for p in products]
+            with self.engine.connect() as conn:
+                tags = _feature_lists(conn.execute(FEATURE_ROWS))
+                return _product_dicts(conn.execute(PRODUCT_ROWS), tags)
         except SQLAlchemyError:
             return []
 
     def get_product(self, pid: int) -> Optional[Dict[str, Any]]:
         try:
-            with Session(self.engine) as ses:
-                p = ses.get(Product, pid)
-                return self._model_to_dict(p) if p else None
+            with self.engine.connect() as conn:
+                tags = _feature_lists(conn.execute(FEATURE_ROWS.where(ProductFeature.product_id == pid)))
+                products = _product_dicts(conn.execute(PRODUCT_ROWS.where(Product.id == pid)), tags)
+                return products[0] if products else None
         except SQLAlchemyError:
             return None
 
+    def product_ids_with_features(self, features: List[str], match_all: bool = False) -> List[int]:
+        """
+        Ids of products tagged with any (or, with match_all, every) of the given features,
+        answered from the (tag, product_id) index without reading the products table.
+        """
+        tags = list(dict.fromkeys(features))
+        if not tags:
+            return []
+        q = (select(ProductFeature.product_id)
+             .where(ProductFeature.tag.in_(tags))
+             .group_by(ProductFeature.product_id)
+             .order_by(ProductFeature.product_id))
+        if match_all:
+            q = q.having(func.count(func.distinct(ProductFeature.tag)) == len(tags))
+        try:
+            with self.engine.connect() as conn:
+                return list(conn.scalars(q))
+        except SQLAlchemyError:
+            return []
+
+    def _search_vocabularies(self) -> Dict[str, Vocabulary]:
+        """Distinct category/brand/color values (index-only scans), kept until a non-stock product write."""
+        with self._index_lock:
+            epoch, vocabularies = self._content_epoch, self._vocabularies
+        if vocabularies is not None:
+            return vocabularies
+        vocabularies = {}
+        with self.engine.connect() as conn:
+            for key in SEARCH_VOCABULARY_COLUMNS:
+                vocab = vocabularies[key] = Vocabulary()
+                for value in conn.scalars(select(Product.__table__.c[key]).distinct()):
+                    vocab.intern(value)
+        with self._index_lock:
+            if self._content_epoch == epoch:
+                self._vocabularies = vocabularies
+        return vocabularies
+
+    def search_products(
+        self,
+        name: str = None,
+        category: str = None,
+        max_price: int = None,
+        brand: str = None,
+        color: str = None,
+        features: List[str] = None,
+        k: Optional[int] = None,
+        query: str = None,
+        candidates: Optional[List[int]] = None,
+        candidate_scores: Optional[Dict[int, float]] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        CatalogIndex.search answered in SQL, for when no current resident index exists.
+
+        Exact predicates run in the query: price <= max_price, the product_features tag index,
+        and category/brand/color IN the distinct values the fuzzy term matches, each with its
+        similarity as a CASE constant. Without a text similarity the score, ranking and LIMIT k
+        run in SQL too; with one (name, query or candidate_scores), only the rows passing the
+        SQL predicates come back (id, name and the scoring columns) to be scored in Python.
+        Returns (products, total_found): the best k as list_products() dicts plus their
+        similarity fields and _score, in ranking order, with the same values and tie order as
+        CatalogIndex.search, full-text and semantic modes included.
+        """
+        products = Product.__table__
+        where = []
+        sims = {}
+        vocabularies = self._search_vocabularies()
+        for key, term in (("category", category), ("brand", brand), ("color", color)):
+            if term:
+                vocab = vocabularies[key]
+                table = vocab.match(term.lower(), 70)
+                matched = {vocab.values[c]: float(table[c]) for c in np.flatnonzero(table >= 70).tolist()}
+                if not matched:
+                    return [], 0
+                where.append(products.c[key].in_(list(matched)))
+                sims[f"_{key}_similarity"] = case(matched, value=products.c[key])
+        if candidates is not None:
+            where.append(products.c.id.in_(list(candidates)))
+        if max_price:
+            where.append(products.c.price <= max_price)
+        hits = None
+        if features:
+            tags = ProductFeature.__table__
+            where.append(products.c.id.in_(select(tags.c.product_id).where(tags.c.tag.in_(features))))
+            # One point per requested feature the product has, repeats included, like the bitset stage
+            has_tag = [case((select(tags.c.product_id).where(tags.c.product_id == products.c.id, tags.c.tag == f)
+                             .exists(), 1), else_=0) for f in features]
+            hits = sum(has_tag[1:], has_tag[0])
+
+        with self.engine.connect() as conn:
+            if name or query or candidate_scores is not None:
+                columns = [products.c.id, products.c.name, products.c.brand, products.c.category,
+                           products.c.rating, products.c.stock]
+                columns += [sim.label(key) for key, sim in sims.items()]
+                if hits is not None:
+                    columns.append(hits.label("_hits"))
+                rows = conn.execute(select(*columns).where(*where).order_by(products.c.id)).mappings().all()
+                # The same text similarity and cutoff as CatalogIndex's name, scores or query stage
+                cutoff = None
+                if name:
+                    cutoff = 60
+                    name_sims = batch_scores(fuzz.partial_ratio, name.lower(), [(r["name"] or "").lower() for r in rows], cutoff)
+                elif candidate_scores is not None:
+                    name_sims = np.array([candidate_scores.get(r["id"], 0.0) for r in rows], dtype=np.float64)
+                else:
+                    cutoff = QUERY_CUTOFF
+                    row_tags = _feature_lists(conn.execute(
+                        FEATURE_ROWS.where(ProductFeature.product_id.in_([r["id"] for r in rows]))))
+                    texts = [search_text(r["name"], r["brand"], r["category"], row_tags.get(r["id"], [])) for r in rows]
+                    name_sims = query_similarity(query.lower(), texts)
+                if cutoff is not None:
+                    rows = [r for r, keep in zip(rows, (name_sims >= cutoff).tolist()) if keep]
+                    name_sims = name_sims[name_sims >= cutoff]
+                column = lambda key: np.array([r[key] for r in rows], dtype=np.float64)
+                row_sims = {"_name_similarity": name_sims, **{key: column(key) for key in sims}}
+                # Accumulated in CatalogIndex._rank's order so the floats come out identical
+                score = column("rating") * 20
+                for key, weight in SIMILARITY_WEIGHTS:
+                    if key in row_sims:
+                        score += row_sims[key] * weight
+                if hits is not None:
+                    score += 10 * column("_hits")
+                stock = column("stock")
+                score -= np.where(stock == 0, 50, np.where(stock < 3, 20, 0))
+                top = _top_k(score, k).tolist()
+                ranked = [(rows[i]["id"], float(score[i]), {key: float(row_sims[key][i]) for key in row_sims}) for i in top]
+                total_found = len(rows)
+            else:
+                score = products.c.rating * 20
+                for key, weight in SIMILARITY_WEIGHTS:
+                    if key in sims:
+                        score = score + sims[key] * weight
+                if hits is not None:
+                    score = score + 10 * hits
+                score = score - case((products.c.stock == 0, 50), (products.c.stock < 3, 20), else_=0)
+                q = (select(products.c.id, score.label("_score"), func.count().over().label("_total"),
+                            *(sim.label(key) for key, sim in sims.items()))
+                     .where(*where).order_by(score.desc(), products.c.id).limit(k))
+                rows = conn.execute(q).mappings().all()
+                ranked = [(r["id"], float(r["_score"]), {key: float(r[key]) for key in sims}) for r in rows]
+                total_found = rows[0]["_total"] if rows else 0
+
+            # Only the ranked page is read in full
+            ids = [pid for pid, _, _ in ranked]
+            tags = _feature_lists(conn.execute(FEATURE_ROWS.where(ProductFeature.product_id.in_(ids))))
+            by_id = {p["id"]: p for p in _product_dicts(conn.execute(PRODUCT_ROWS.where(Product.id.in_(ids))), tags)}
+        results = []
+        for pid, row_score, row_sims in ranked:
+            p = by_id[pid]
+            for key, _ in SIMILARITY_WEIGHTS:
+                if key in row_sims:
+                    p[key] = row_sims[key]
+            p["_score"] = row_score
+            results.append(p)
+        return results, total_found
+
     def place_order(self, user_id: str, pid: int, qty: int) -> Dict[str, Any]:
         """
         Place an order for user_id. Returns {"ok": True, "order": {...}} on success,
         or {"ok": False, "message": "..."} on failure.
+
+        One transaction: a conditional stock decrement (so concurrent orders can never
+        oversell), a user upsert and the order insert. The resident index's stock is patched
+        before the commit, while the transaction still holds the write lock, so concurrent
+        orders patch it in commit order.
         """
+        if qty < 1:
+            return {"ok": False, "message": "Quantity must be at least 1."}
+        patched = False
         try:
-            with Session(self.engine) as ses:
-                # Ensure user exists
-                from baseClass import User, OrderStatus
-                user = ses.get(User, user_id)
-                if not user:
-                    user = User(user_id=user_id)
-                    ses.add(user)
-                    ses.commit()
-                
-                prod = ses.get(Product, pid)
-                if not prod:
-                    return {"ok": False, "message": "Product not found."}
-                if prod.stock < qty:
-                    return {"ok": False, "message": f"Only {prod.stock} left in stock."}
-
-                order = Order(
-                    user_id=user_id, 
-                    product_id=pid, 
-                    quantity=qty, 
-                    total_price=prod.price * qty,
-                    status=OrderStatus.CONFIRMED
-                )
-                prod.stock = prod.stock - qty
-
-                ses.add(order)
-                ses.add(prod)
-                ses.commit()
-                ses.refresh(order)
-                
-                # Format order with Rs. prefix
-                order_dict = self._model_to_dict(order)
-                order_dict["total_price_formatted"] = f"Rs. {order_dict['total_price']}"
-                order_dict["product_name"] = prod.name
-                
-                return {"ok": True, "order": order_dict}
+            with self.engine.begin() as conn:
+                reserved = conn.execute(RESERVE_STOCK, {"pid": pid, "qty": qty}).first()
+                if reserved is None:
+                    stock = conn.scalar(PRODUCT_STOCK, {"pid": pid})
+                    if stock is None:
+                        return {"ok": False, "message": "Product not found."}
+                    return {"ok": False, "message": f"Only {stock} left in stock."}
+                conn.execute(UPSERT_USER, {"user_id": user_id})
+                values = _order_values(user_id, pid, qty, reserved.price)
+                order_id = conn.execute(INSERT_ORDER, values).scalar_one()
+                self._bump_catalog_version(stock={pid: reserved.stock})
+                patched = True
+            return {"ok": True, "order": _order_dict(order_id, values, reserved.name)}
+        except SQLAlchemyError as e:
+            if patched:
+                self._discard_stock_patch()
+            return {"ok": False, "message": str(e)}
+    def place_orders_bulk(self, user_id: str, items: List[Tuple[int, int]]) -> Dict[str, Any]:
+        """
+        Place one order per (pid, qty) cart line, all or nothing, in a single transaction of
+        three statements whatever the cart size: one conditional stock decrement for every
+        product, the user upsert and one multi-row order insert. Returns {"ok": True,
+        "orders": [...], "total_price": ...}, or {"ok": False, "message": ...} naming the first
+        product that could not be filled; nothing is written in that case.
+        """
+        error = _cart_error(items)
+        if error:
+            return {"ok": False, "message": error}
+        totals = _cart_totals(items)
+        patched = False
+        try:
+            with self.engine.begin() as conn:
+                reserved = {row.id: row for row in conn.execute(RESERVE_CART, {"cart": json.dumps(list(totals.items()))})}
+                missing = next((pid for pid in totals if pid not in reserved), None)
+                if missing is not None:
+                    row = conn.execute(select(Product.stock, Product.name).where(Product.id == missing)).first()
+                    raise _OrderRejected(_rejected_line(missing, totals[missing], *(row or (None, None))))
+                conn.execute(UPSERT_USER, {"user_id": user_id})
+                lines = [(_order_values(user_id, pid, qty, reserved[pid].price), reserved[pid].name) for pid, qty in items]
+                # One multi-row INSERT for every line
+                order_ids = conn.execute(INSERT_ORDER, [values for values, _ in lines]).scalars().all()
+                # Under the write lock, like place_order
+                self._bump_catalog_version(stock={pid: row.stock for pid, row in reserved.items()})
+                patched = True
+        except _OrderRejected as e:
+            return {"ok": False, "message": str(e)}
         except SQLAlchemyError as e:
+            if patched:
+                self._discard_stock_patch()
             return {"ok": False, "message": str(e)}
+        orders = [_order_dict(order_id, values, name) for order_id, (values, name) in zip(order_ids, lines)]
+        total = sum(o["total_price"] for o in orders)
+        return {"ok": True, "orders": orders, "total_price": total}
+
         # def place_order(self, user_id: str, pid: int, qty: int) -> Dict[str, Any]:
     #     """
     #     Place an order for user_id. Returns {"ok": True, "order": {...}} on success,
@@ -306,7 +903,9 @@ class SQLProductStore:
     def get_user_orders(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         try:
             with Session(self.engine) as ses:
-                q = ses.query(Order).filter(Order.user_id == user_id).order_by(Order.order_id.desc()).limit(limit)
+                # Join the product in the same SELECT; to_dict() reads product.name for every order
+                q = (ses.query(Order).options(ORDER_PRODUCT).filter(Order.user_id == user_id)
+                     .order_by(Order.order_id.desc()).limit(limit))
                 return [o.to_dict() for o in q.all()]
         except SQLAlchemyError:
             return []
@@ -314,7 +913,7 @@ class SQLProductStore:
     def get_order(self, user_id: str, order_id: int) -> Dict[str, Any]:
         try:
             with Session(self.engine) as ses:
-                order = ses.get(Order, order_id)
+                order = ses.get(Order, order_id, options=[ORDER_PRODUCT])
                 if not order:
                     return {"ok": False, "message": "Order not found."}
                 # ensure ownership
@@ -354,7 +953,7 @@ class SQLProductStore:
     def get_return_status(self, user_id: str, return_id: int) -> Dict[str, Any]:
         from baseClass import OrderReturn
         with Session(self.engine) as ses:
-            ret = ses.get(OrderReturn, return_id)
+            ret = ses.get(OrderReturn, return_id, options=[joinedload(OrderReturn.order)])
             if not ret or ret.order.user_id != user_id:
                 return {"ok": False, "message": "Return request not found."}
             return {"ok": True, "return": ret.to_dict()}
@@ -401,26 +1000,187 @@ class SQLProductStore:
     #         except Exception:
     #             pass
     #     return out
-    def _model_to_dict(self, obj) -> Dict[str, Any]:
-        if obj is None:
-            return {}
-        out = {}
-        for col in obj.__table__.columns:
-            val = getattr(obj, col.name)
-            if isinstance(val, (list, dict)):
-                out[col.name] = val
-            elif isinstance(val, datetime):
-                out[col.name] = val.isoformat()
-            elif hasattr(val, 'value'):  # For Enum types like OrderStatus
-                out[col.name] = val.value
-            else:
-                out[col.name] = val
-        if "features" in out and isinstance(out["features"], str):
-            try:
-                out["features"] = json.loads(out["features"])
-            except Exception:
-                pass
-        return out
 
 
-store = SQLProductStore(seed_data=SEED_PRODUCTS)
\ No newline at end of file
+class AsyncSQLProductStore:
+    """
+    Async counterpart of SQLProductStore over aiosqlite, for callers running on the agent's
+    event loop: a query awaits instead of blocking every other session on the loop.
+
+    The schema and seed data belong to the sync store it is given as `catalog`; its catalog
+    version and resident index are shared, so product writes made here invalidate cached
+    searches exactly like the sync store's own writes. Relationships are eager-loaded, since
+    lazy loads are not possible on an AsyncSession.
+    """
+
+    def __init__(self, catalog: SQLProductStore, db_url: str = "sqlite+aiosqlite:///shopgenie.db",
+                 engine_profile: Optional[Dict[str, Any]] = None):
+        profile = SQLITE_ENGINE_PROFILE if engine_profile is None else engine_profile
+        self.catalog = catalog
+        self.engine = create_async_engine(db_url, echo=False, **_engine_options(db_url, profile))
+        apply_sqlite_pragmas(self.engine, profile.get("pragmas"))
+        self.SessionLocal = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+    def catalog_index(self) -> CatalogIndex:
+        return self.catalog.catalog_index()
+
+    async def close(self):
+        """Dispose of the engine's pooled connections; call it on the loop that used them."""
+        await self.engine.dispose()
+
+    async def list_products(self) -> List[Dict[str, Any]]:
+        try:
+            async with self.engine.connect() as conn:
+                tags = _feature_lists(await conn.execute(FEATURE_ROWS))
+                return _product_dicts(await conn.execute(PRODUCT_ROWS), tags)
+        except SQLAlchemyError:
+            return []
+
+    async def get_product(self, pid: int) -> Optional[Dict[str, Any]]:
+        try:
+            async with self.engine.connect() as conn:
+                tags = _feature_lists(await conn.execute(FEATURE_ROWS.where(ProductFeature.product_id == pid)))
+                products = _product_dicts(await conn.execute(PRODUCT_ROWS.where(Product.id == pid)), tags)
+                return products[0] if products else None
+        except SQLAlchemyError:
+            return None
+
+    async def place_order(self, user_id: str, pid: int, qty: int) -> Dict[str, Any]:
+        """
+        Place an order for user_id. Returns {"ok": True, "order": {...}} on success,
+        or {"ok": False, "message": "..."} on failure. Same single transaction as
+        SQLProductStore.place_order, including the stock patch before the commit.
+        """
+        if qty < 1:
+            return {"ok": False, "message": "Quantity must be at least 1."}
+        patched = False
+        try:
+            async with self.engine.begin() as conn:
+                reserved = (await conn.execute(RESERVE_STOCK, {"pid": pid, "qty": qty})).first()
+                if reserved is None:
+                    stock = await conn.scalar(PRODUCT_STOCK, {"pid": pid})
+                    if stock is None:
+                        return {"ok": False, "message": "Product not found."}
+                    return {"ok": False, "message": f"Only {stock} left in stock."}
+                await conn.execute(UPSERT_USER, {"user_id": user_id})
+                values = _order_values(user_id, pid, qty, reserved.price)
+                order_id = (await conn.execute(INSERT_ORDER, values)).scalar_one()
+                self.catalog._bump_catalog_version(stock={pid: reserved.stock})
+                patched = True
+            return {"ok": True, "order": _order_dict(order_id, values, reserved.name)}
+        except SQLAlchemyError as e:
+            if patched:
+                self.catalog._discard_stock_patch()
+            return {"ok": False, "message": str(e)}
+
+    async def place_orders_bulk(self, user_id: str, items: List[Tuple[int, int]]) -> Dict[str, Any]:
+        """All-or-nothing cart checkout; same transaction and results as SQLProductStore.place_orders_bulk."""
+        error = _cart_error(items)
+        if error:
+            return {"ok": False, "message": error}
+        totals = _cart_totals(items)
+        patched = False
+        try:
+            async with self.engine.begin() as conn:
+                result = await conn.execute(RESERVE_CART, {"cart": json.dumps(list(totals.items()))})
+                reserved = {row.id: row for row in result}
+                missing = next((pid for pid in totals if pid not in reserved), None)
+                if missing is not None:
+                    row = (await conn.execute(select(Product.stock, Product.name).where(Product.id == missing))).first()
+                    raise _OrderRejected(_rejected_line(missing, totals[missing], *(row or (None, None))))
+                await conn.execute(UPSERT_USER, {"user_id": user_id})
+                lines = [(_order_values(user_id, pid, qty, reserved[pid].price), reserved[pid].name) for pid, qty in items]
+                order_ids = (await conn.execute(INSERT_ORDER, [values for values, _ in lines])).scalars().all()
+                self.catalog._bump_catalog_version(stock={pid: row.stock for pid, row in reserved.items()})
+                patched = True
+        except _OrderRejected as e:
+            return {"ok": False, "message": str(e)}
+        except SQLAlchemyError as e:
+            if patched:
+                self.catalog._discard_stock_patch()
+            return {"ok": False, "message": str(e)}
+        orders = [_order_dict(order_id, values, name) for order_id, (values, name) in zip(order_ids, lines)]
+        total = sum(o["total_price"] for o in orders)
+        return {"ok": True, "orders": orders, "total_price": total}
+
+    async def get_user_orders(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        try:
+            async with self.SessionLocal() as ses:
+                q = (select(Order).options(ORDER_PRODUCT).where(Order.user_id == user_id)
+                     .order_by(Order.order_id.desc()).limit(limit))
+                return [o.to_dict() for o in (await ses.scalars(q)).all()]
+        except SQLAlchemyError:
+            return []
+
+    async def get_order(self, user_id: str, order_id: int) -> Dict[str, Any]:
+        try:
+            async with self.SessionLocal() as ses:
+                order = await ses.get(Order, order_id, options=[ORDER_PRODUCT])
+                if not order:
+                    return {"ok": False, "message": "Order not found."}
+                # ensure ownership
+                if order.user_id != user_id:
+                    return {"ok": False, "message": "Not your order."}
+                return {"ok": True, "order": order.to_dict()}
+        except SQLAlchemyError as e:
+            return {"ok": False, "message": str(e)}
+
+    async def request_return(self, user_id: str, order_id: int, reason: Optional[str] = None) -> Dict[str, Any]:
+        from baseClass import OrderStatus, ReturnStatus, OrderReturn
+        try:
+            async with self.SessionLocal() as ses:
+                order = await ses.get(Order, order_id)
+                if not order:
+                    return {"ok": False, "message": "Order not found."}
+                if order.user_id != user_id:
+                    return {"ok": False, "message": "Not your order."}
+
+                order.status = OrderStatus.RETURNED
+                return_request = OrderReturn(
+                    order_id=order_id,
+                    reason=reason,
+                    status=ReturnStatus.REQUESTED,
+                    refund_amount=order.total_price
+                )
+                ses.add(return_request)
+                await ses.commit()
+                await ses.refresh(return_request)
+
+                return {"ok": True, "return": return_request.to_dict(), "refund_amount": return_request.refund_amount}
+        except SQLAlchemyError as e:
+            return {"ok": False, "message": str(e)}
+
+    async def get_return_status(self, user_id: str, return_id: int) -> Dict[str, Any]:
+        from baseClass import OrderReturn
+        async with self.SessionLocal() as ses:
+            ret = await ses.get(OrderReturn, return_id, options=[joinedload(OrderReturn.order)])
+            if not ret or ret.order.user_id != user_id:
+                return {"ok": False, "message": "Return request not found."}
+            return {"ok": True, "return": ret.to_dict()}
+
+    async def flag_suspicious_return(self, user_id: str, order_id: int, reason: str) -> Dict[str, Any]:
+        from baseClass import SuspiciousReturn
+        try:
+            async with self.SessionLocal() as ses:
+                order = await ses.get(Order, order_id)
+                if not order or order.user_id != user_id:
+                    return {"ok": False, "message": "Order not found or does not belong to the user."}
+
+                ses.add(SuspiciousReturn(order_id=order_id, user_id=user_id, reason=reason))
+                await ses.commit()
+                return {"ok": True, "message": "Return flagged for review."}
+        except SQLAlchemyError as e:
+            return {"ok": False, "message": str(e)}
+
+    async def get_user_return_count(self, user_id: str) -> Dict[str, Any]:
+        from baseClass import OrderReturn
+        try:
+            async with self.SessionLocal() as ses:
+                q = select(func.count()).select_from(OrderReturn).join(Order).where(Order.user_id == user_id)
+                return {"ok": True, "count": await ses.scalar(q)}
+        except SQLAlchemyError as e:
+            return {"ok": False, "message": str(e)}
+
+
+store = SQLProductStore(seed_data=SEED_PRODUCTS)
+async_store = AsyncSQLProductStore(store)
\ No newline at end of file
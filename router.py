@@ -0,0 +1,170 @@
+import re
+from typing import Dict, Any, List, Optional
+import intentparser
+from productstore import store
+from tools import get_my_orders, check_order_status, check_return_status, retrieve_products
+
+# Only requests routed with at least this confidence skip the orchestrator LLM
+MIN_CONFIDENCE = 0.9
+
+# Products listed in a fast-path search answer (the product agent shows at least 15 too)
+FAST_PATH_PRODUCTS = 15
+
+# Words a product search may contain besides the recognised intent; anything else
+# ("order", "return", "cheapest", "compare", ...) sends the request to the LLM
+SEARCH_FILLER = {
+    "show", "me", "find", "search", "for", "list", "looking", "look", "browse", "display",
+    "see", "get", "i", "i'm", "im", "want", "need", "some", "any", "a", "an", "the", "all",
+    "with", "in", "of", "please", "products", "items", "options", "from", "by", "brand",
+    "color", "colour", "colored", "coloured", "that", "are", "is", "have", "you", "do",
+    "can", "what", "which", "and", "or",
+    # plural tails left over when a singular keyword matched ("phones" -> "phone" + "s")
+    "s", "es",
+}
+
+_NUMBER = r"(?:(?:number|no\.?|id) )?#?(?P<{group}>\d+)"
+
+
+def _status_patterns(noun: str, group: str) -> List["re.Pattern"]:
+    """Phrasings of "what is the status of <noun> N", fullmatched against the normalized query."""
+    number = _NUMBER.format(group=group)
+    return [re.compile(p) for p in (
+        rf"(?:what(?:'s| is) the |check (?:the )?|get (?:the )?|show (?:me )?(?:the )?)?status (?:of|for) (?:my )?{noun} {number}",
+        rf"(?:check |show |get )?(?:my )?{noun} {number}(?:'s)? status",
+        rf"(?:check|track|where is|where's)(?: my)? {noun} {number}",
+    )]
+
+
+_RECENT = r"(?:last|recent|latest|past|previous)"
+MY_ORDERS_PATTERNS = [re.compile(p) for p in (
+    rf"(?:(?:show|list|view|see|get|display|check)(?: me)? )?(?:all )?my (?:{_RECENT} )?(?:(?P<limit>\d{{1,2}}) )?(?:{_RECENT} )?orders(?: history)?",
+    r"(?:(?:show|view|see|get|display|check)(?: me)? )?(?:my )?order history",
+    r"what (?:have i|did i) order(?:ed)?",
+)]
+ORDER_STATUS_PATTERNS = _status_patterns("order", "order_id")
+RETURN_STATUS_PATTERNS = _status_patterns(r"return(?: request)?", "return_id")
+
+
+def _normalize(query: str) -> str:
+    q = " ".join(query.lower().split()).rstrip("?.! ")
+    q = re.sub(r"^(?:please|hey|hi),? ", "", q)
+    return re.sub(r",? please$", "", q)
+
+
+def _fullmatch(patterns, q: str) -> Optional["re.Match"]:
+    for pattern in patterns:
+        m = pattern.fullmatch(q)
+        if m:
+            return m
+    return None
+
+
+def route(query: str) -> Optional[Dict[str, Any]]:
+    """
+    Map a request to a single tool call when its meaning is unambiguous.
+
+    Returns {"tool", "args", "confidence"}, or None when no rule applies. Order and return
+    lookups are anchored patterns (confidence 1.0); a product search scores by how much of
+    the query parse_intent accounts for, so anything it cannot explain lowers confidence.
+    """
+    q = _normalize(query)
+    if not q:
+        return None
+    m = _fullmatch(MY_ORDERS_PATTERNS, q)
+    if m:
+        args = {"limit": int(m.group("limit"))} if m.groupdict().get("limit") else {}
+        return {"tool": "get_my_orders", "args": args, "confidence": 1.0}
+    m = _fullmatch(ORDER_STATUS_PATTERNS, q)
+    if m:
+        return {"tool": "check_order_status", "args": {"order_id": int(m.group("order_id"))}, "confidence": 1.0}
+    m = _fullmatch(RETURN_STATUS_PATTERNS, q)
+    if m:
+        return {"tool": "check_return_status", "args": {"return_id": int(m.group("return_id"))}, "confidence": 1.0}
+
+    index = store.catalog_index()
+    intent = intentparser.parse(q, index)
+    if not (intent["category"] or intent["brand"]):
+        return None
+    unexplained = [w for w in intentparser.uncovered_words(q, index) if w not in SEARCH_FILLER]
+    recognised = sum(1 for field in ("category", "brand", "color", "max_price") if intent[field]) + len(intent["features"])
+    confidence = recognised / (recognised + len(unexplained))
+    args = {k: v for k, v in intent.items() if v}
+    return {"tool": "retrieve_products", "args": args, "confidence": confidence}
+
+
+def _render_orders(result: Dict[str, Any]) -> str:
+    orders = result["data"]["orders"]
+    if not orders:
+        return "You don't have any orders yet."
+    lines = [f"Here are your {len(orders)} most recent orders:", ""]
+    for o in orders:
+        lines.append(
+            f"- **Order #{o['order_id']}**: {o['product_name']} × {o['quantity']}, "
+            f"{o['total_price_formatted']}, {o['status']} (placed {o['created_at'][:10]})"
+        )
+    return "\n".join(lines)
+
+
+def _render_order(result: Dict[str, Any]) -> str:
+    o = result["data"]["order"]
+    return (
+        f"Order #{o['order_id']} ({o['product_name']} × {o['quantity']}, {o['total_price_formatted']}) "
+        f"is **{o['status']}**. It was placed on {o['created_at'][:10]} and last updated on {o['updated_at'][:10]}."
+    )
+
+
+def _render_return(result: Dict[str, Any]) -> str:
+    r = result["data"]["return"]
+    text = f"Return #{r['return_id']} for order #{r['order_id']} is **{r['status']}**."
+    if r.get("refund_amount_formatted"):
+        text += f" Refund amount: {r['refund_amount_formatted']}."
+    if r.get("completed_at"):
+        text += f" Completed on {r['completed_at'][:10]}."
+    return text
+
+
+def _render_products(result: Dict[str, Any]) -> Optional[str]:
+    data = result["data"]
+    products = data["products"]
+    if not products:
+        # Let the LLM relax the filters or ask a follow-up instead of a bare "nothing found"
+        return None
+    total = data["total_found"]
+    found = f"I found {total} matching product{'s' if total != 1 else ''}."
+    lines = [found + (f" Here are the top {len(products)}:" if total > len(products) else ""), ""]
+    for p in products:
+        lines.append(f"- [{p['name']}](?product_id={p['id']}): {p['price_formatted']}, rated {p['rating']}, stock: {p['stock']}")
+    if data["has_more"]:
+        lines += ["", "Ask for more to see the rest."]
+    return "\n".join(lines)
+
+
+def fast_answer(query: str, min_confidence: float = MIN_CONFIDENCE) -> Optional[str]:
+    """
+    Answer a request directly from its tool when route() is confident enough, or None to
+    leave it to the orchestrator. Tool errors for order/return lookups are reported as-is.
+    """
+    r = route(query)
+    if r is None or r["confidence"] < min_confidence:
+        return None
+    tool, args = r["tool"], r["args"]
+    try:
+        if tool == "get_my_orders":
+            result = get_my_orders(**args)
+            return _render_orders(result) if result["status"] == "success" else None
+        if tool == "check_order_status":
+            result = check_order_status(**args)
+            if result["status"] == "success":
+                return _render_order(result)
+            return f"I couldn't look up order #{args['order_id']}: {result['error_message']}"
+        if tool == "check_return_status":
+            result = check_return_status(**args)
+            if result["status"] == "success":
+                return _render_return(result)
+            return f"I couldn't look up return #{args['return_id']}: {result['error_message']}"
+        if tool == "retrieve_products":
+            result = retrieve_products(**args, limit=FAST_PATH_PRODUCTS)
+            return _render_products(result) if result["status"] == "success" else None
+    except Exception as e:
+        print(f"fast path error, falling back to the orchestrator: {e}")
+    return None
@@ -0,0 +1,377 @@
+from typing import Any, Dict, List, Optional, Iterable, Tuple
+import os
+import re
+import zlib
+from itertools import chain
+import numpy as np
+
+# Request filler that says nothing about which product is wanted
+STOPWORDS = {
+    "a", "an", "the", "for", "of", "to", "in", "on", "with", "and", "or", "me", "my", "i", "im",
+    "i'm", "want", "need", "looking", "something", "anything", "some", "any", "good", "best",
+    "great", "nice", "new", "show", "find", "get", "buy", "that", "is", "are", "can", "do",
+    "you", "have", "please", "recommend", "suggest", "which", "what",
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:['-][a-z0-9]+)*")
+
+# Changing the features or weights changes every vector; saved matrices record this version
+EMBEDDER_VERSION = 2
+# Texts accumulated per np.bincount call when encoding
+ENCODE_CHUNK = 8192
+# Catalog concept features: a word found in at least EXPANSION_MIN_DF products, at least
+# EXPANSION_MIN_SHARE of them in one category, also emits that category's feature
+EXPANSION_MIN_DF = 2
+EXPANSION_MIN_SHARE = 0.5
+# Names a local sentence-transformers model directory for ModelEmbedder (see load_embedder)
+EMBEDDING_MODEL_ENV = "SHOPGENIE_EMBEDDING_MODEL"
+
+
+def _stem(word: str) -> str:
+    """Plural stripping only: "shoes" -> "shoe", "earbuds" -> "earbud", "glass" stays."""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _words_of(token: str) -> List[str]:
+    """The stemmed, non-stopword words of a token; a hyphenated token also counts its parts."""
+    words = [token] + (token.split("-") if "-" in token else [])
+    return [w for w in map(_stem, words) if w not in STOPWORDS]
+
+
+def _tokenize(texts: Iterable[str]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """(distinct tokens, token id of every occurrence, end offset of each text's occurrences)."""
+    tokens = [_TOKEN.findall(text.lower()) for text in texts]
+    flat = list(chain.from_iterable(tokens))
+    vocab = {token: i for i, token in enumerate(dict.fromkeys(flat))}
+    token_ids = np.fromiter(map(vocab.__getitem__, flat), dtype=np.int64, count=len(flat))
+    text_ends = np.cumsum(np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens)))
+    return list(vocab), token_ids, text_ends
+
+
+def _expand(per_token: List[List[Any]], token_ids: np.ndarray, text_ends: np.ndarray,
+            first: int, last: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For texts first..last-1: (text row, entry index into chain(*per_token)) of every item
+    every token occurrence contributes, in CSR form so no Python loop runs per occurrence.
+    """
+    counts = np.fromiter(map(len, per_token), dtype=np.int64, count=len(per_token))
+    start = np.cumsum(counts) - counts
+    lo = text_ends[first - 1] if first else 0
+    chunk = token_ids[lo:text_ends[last - 1]] if last > first else token_ids[:0]
+    occurrence_counts = counts[chunk]
+    entry = (np.repeat(start[chunk] - (np.cumsum(occurrence_counts) - occurrence_counts), occurrence_counts)
+             + np.arange(occurrence_counts.sum()))
+    rows = np.repeat(np.repeat(np.arange(last - first), np.diff(text_ends[first:last], prepend=lo)), occurrence_counts)
+    return rows, entry
+
+
+class HashingEmbedder:
+    """
+    Offline fallback embedding: TF-IDF over signed-hashed features (each word and its
+    character trigrams) in `dim` buckets, L2-normalized.
+
+    fit() learns the IDF weights and, given each product's category, concept features from
+    the catalog itself: a word that mostly occurs in one category (a feature tag such as
+    "cushioned", a model line such as "galaxy") also emits that category's feature, so a query
+    using it lands near the whole category. A word the catalog never uses only contributes
+    its trigrams; matching by meaning beyond the catalog's own vocabulary needs a model
+    (ModelEmbedder).
+    """
+
+    name = "hashing"
+    WORD_WEIGHT = 1.0
+    CONCEPT_WEIGHT = 1.5
+    TRIGRAM_WEIGHT = 0.25
+
+    def __init__(self, dim: int = 256, idf: Optional[np.ndarray] = None,
+                 expansions: Optional[Dict[str, List[Tuple[int, float]]]] = None):
+        self.dim = dim
+        self.idf = idf if idf is not None else np.ones(dim, dtype=np.float32)
+        # {stemmed word: [(bucket, value), ...]}: the category features fit() learned for it
+        self.expansions = expansions or {}
+
+    def _hashed(self, feature: str, weight: float) -> Tuple[int, float]:
+        h = zlib.crc32(feature.encode())
+        return h % self.dim, weight if (h >> 31) & 1 else -weight
+
+    def _features_of(self, token: str) -> List[Tuple[int, float]]:
+        """(bucket, signed weight) pairs one token contributes."""
+        features = []
+        for word in _words_of(token):
+            features.append(self._hashed("w:" + word, self.WORD_WEIGHT))
+            features += self.expansions.get(word, ())
+            padded = f" {word} "
+            features += [self._hashed("t:" + padded[i:i + 3], self.TRIGRAM_WEIGHT) for i in range(len(padded) - 2)]
+        return features
+
+    def _term_matrix(self, vocab: List[str], token_ids: np.ndarray, text_ends: np.ndarray) -> np.ndarray:
+        """Raw (un-weighted) feature sums per text, summed with np.bincount a chunk of texts at a time."""
+        features = [self._features_of(token) for token in vocab]
+        pairs = list(chain.from_iterable(features))
+        buckets = np.array([b for b, _ in pairs], dtype=np.int64)
+        values = np.array([v for _, v in pairs], dtype=np.float64)
+        matrix = np.zeros((len(text_ends), self.dim), dtype=np.float32)
+        for first in range(0, len(text_ends), ENCODE_CHUNK):
+            last = min(first + ENCODE_CHUNK, len(text_ends))
+            rows, entry = _expand(features, token_ids, text_ends, first, last)
+            matrix[first:last] = np.bincount(rows * self.dim + buckets[entry], weights=values[entry],
+                                             minlength=(last - first) * self.dim).reshape(last - first, self.dim)
+        return matrix
+
+    def _learn_expansions(self, vocab: List[str], token_ids: np.ndarray, text_ends: np.ndarray,
+                          labels: List[Optional[str]]) -> Dict[str, List[Tuple[int, float]]]:
+        """Per word, the share of the products using it in each category; shares of at least EXPANSION_MIN_SHARE become features."""
+        words: Dict[str, int] = {}
+        token_words = [[words.setdefault(w, len(words)) for w in _words_of(token)] for token in vocab]
+        if not words:
+            return {}
+        word_ids = np.fromiter(chain.from_iterable(token_words), dtype=np.int64)
+        rows, entry = _expand(token_words, token_ids, text_ends, 0, len(text_ends))
+        # Each (product, word) once, however often the word occurs in the product's text
+        pairs = np.unique(rows * len(words) + word_ids[entry])
+        product, word = np.divmod(pairs, len(words))
+        categories, codes = np.unique(np.array([label or "" for label in labels]), return_inverse=True)
+        df = np.bincount(word, minlength=len(words))
+        joint = np.bincount(word * len(categories) + codes[product],
+                            minlength=len(words) * len(categories)).reshape(len(words), len(categories))
+        share = joint / np.maximum(df, 1)[:, None]
+        keep = (share >= EXPANSION_MIN_SHARE) & (df >= EXPANSION_MIN_DF)[:, None]
+        keep[:, categories == ""] = False
+        names = list(words)
+        expansions: Dict[str, List[Tuple[int, float]]] = {}
+        for w, c in zip(*np.nonzero(keep)):
+            expansions.setdefault(names[w], []).append(
+                self._hashed("c:" + categories[c], self.CONCEPT_WEIGHT * float(share[w, c])))
+        return expansions
+
+    def _weighted(self, matrix: np.ndarray) -> np.ndarray:
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def fit(self, texts: List[str], labels: Optional[List[Optional[str]]] = None) -> Tuple["HashingEmbedder", np.ndarray]:
+        """A copy fitted to the documents (IDF weights, category concepts from labels) and their embeddings."""
+        vocab, token_ids, text_ends = _tokenize(texts)
+        fitted = HashingEmbedder(self.dim)
+        if labels is not None:
+            fitted.expansions = fitted._learn_expansions(vocab, token_ids, text_ends, labels)
+        matrix = fitted._term_matrix(vocab, token_ids, text_ends)
+        df = np.count_nonzero(matrix, axis=0)
+        fitted.idf = (np.log((1 + len(matrix)) / (1 + df)) + 1).astype(np.float32)
+        return fitted, fitted._weighted(matrix)
+
+    def encode(self, texts: Iterable[str]) -> np.ndarray:
+        """Unit-length float32 embeddings, one row per text (all zeros for a text with no features)."""
+        return self._weighted(self._term_matrix(*_tokenize(texts)))
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Arrays that restore this embedder through load_state()."""
+        words = list(self.expansions)
+        pairs = list(chain.from_iterable(self.expansions[w] for w in words))
+        return {
+            "idf": self.idf,
+            "expansion_words": np.array(words, dtype=str),
+            "expansion_counts": np.array([len(self.expansions[w]) for w in words], dtype=np.int64),
+            "expansion_buckets": np.array([b for b, _ in pairs], dtype=np.int64),
+            "expansion_values": np.array([v for _, v in pairs], dtype=np.float64),
+        }
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> "HashingEmbedder":
+        idf = state["idf"]
+        pairs = list(zip(state["expansion_buckets"].tolist(), state["expansion_values"].tolist()))
+        ends = np.cumsum(state["expansion_counts"]).tolist()
+        starts = [0] + ends[:-1]
+        expansions = {w: pairs[s:e] for w, s, e in zip(state["expansion_words"].tolist(), starts, ends)}
+        return HashingEmbedder(len(idf), idf, expansions)
+
+
+class ModelEmbedder:
+    """
+    A small local sentence-transformers model (e.g. all-MiniLM-L6-v2 saved to a directory) on
+    the CPU. Optional: sentence-transformers is not in requirements.txt, and the model is only
+    ever read from disk, never downloaded.
+    """
+
+    def __init__(self, model_path: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_path, device="cpu", local_files_only=True)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"model:{os.path.abspath(model_path)}"
+
+    def fit(self, texts: List[str], labels: Optional[List[Optional[str]]] = None) -> Tuple["ModelEmbedder", np.ndarray]:
+        return self, self.encode(texts)
+
+    def encode(self, texts: Iterable[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(list(texts), batch_size=64, normalize_embeddings=True,
+                                            convert_to_numpy=True), dtype=np.float32)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> "ModelEmbedder":
+        return self
+
+
+def load_embedder():
+    """
+    ModelEmbedder for the model directory named by $SHOPGENIE_EMBEDDING_MODEL; HashingEmbedder
+    when it is unset or the model cannot be loaded (sentence-transformers missing, no such model).
+    """
+    model_path = os.environ.get(EMBEDDING_MODEL_ENV)
+    if model_path:
+        try:
+            return ModelEmbedder(model_path)
+        except Exception as e:
+            print(f"Embedding model unavailable, using the hashing embedder: {e}")
+    return HashingEmbedder()
+
+
+# Below this many products a query is scored against every vector; above, the IVF index is used
+IVF_MIN_ROWS = 20_000
+# Inverted lists probed per query; recall against brute force is checked by the "semantic" benchmark
+NPROBE = 32
+# Rows per chunk when assigning vectors to centroids
+ASSIGN_CHUNK = 16384
+
+
+def _spherical_kmeans(vectors: np.ndarray, nlist: int, seed: int = 0, iterations: int = 8,
+                      sample: int = 20_000) -> np.ndarray:
+    """Unit-length centroids trained on a sample of the (unit-length) vectors."""
+    rnd = np.random.default_rng(seed)
+    train = vectors[np.sort(rnd.choice(len(vectors), min(sample, len(vectors)), replace=False))]
+    centroids = train[rnd.choice(len(train), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(train @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, train)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # A centroid that lost all its points keeps its previous position
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+    return centroids.astype(np.float32)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.concatenate([np.argmax(vectors[i:i + ASSIGN_CHUNK] @ centroids.T, axis=1)
+                           for i in range(0, len(vectors), ASSIGN_CHUNK)])
+
+
+def fingerprint(ids: List[int], texts: List[str], labels: Optional[List[Optional[str]]], embedder) -> int:
+    """Identifies the catalog content and embedder a saved matrix was built from."""
+    crc = zlib.crc32(f"{EMBEDDER_VERSION}:{embedder.name}:{embedder.dim}:".encode())
+    crc = zlib.crc32(np.asarray(ids, dtype=np.int64).tobytes(), crc)
+    crc = zlib.crc32("\x00".join(texts).encode(), crc)
+    if labels is not None:
+        crc = zlib.crc32("\x00".join(label or "" for label in labels).encode(), crc)
+    return crc
+
+
+class SemanticIndex:
+    """
+    Nearest-neighbour search over unit-length product embeddings (cosine = dot product).
+
+    Small catalogs are searched brute force. From IVF_MIN_ROWS products on, an IVF index is
+    built: spherical k-means centroids, with the vectors stored grouped by list so a query only
+    scans the contiguous slices of its NPROBE closest lists. With a path, the float32 matrix is
+    a memory-mapped .npy file, shared through the page cache and reused after a restart as long
+    as the catalog content and the embedder are unchanged.
+    """
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray, embedder,
+                 centroids: Optional[np.ndarray] = None, bounds: Optional[np.ndarray] = None):
+        self.ids = ids
+        self.vectors = vectors
+        self.embedder = embedder
+        self.centroids = centroids
+        self.bounds = bounds
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids: List[int], texts: List[str], labels: Optional[List[Optional[str]]] = None,
+              embedder=None, path: Optional[str] = None, ivf_min_rows: int = IVF_MIN_ROWS,
+              seed: int = 0) -> "SemanticIndex":
+        """
+        Embed the texts (labels: each product's category, for the hashing embedder's concepts).
+        With a path, reuse the files saved there if they match, else (re)write them.
+        """
+        embedder = embedder if embedder is not None else HashingEmbedder()
+        stamp = fingerprint(ids, texts, labels, embedder)
+        if path:
+            loaded = cls.load(path, stamp, embedder)
+            if loaded is not None:
+                return loaded
+        embedder, vectors = embedder.fit(texts, labels)
+        ids = np.asarray(ids, dtype=np.int64)
+        centroids = bounds = None
+        if len(ids) >= max(ivf_min_rows, 1):
+            nlist = int(np.sqrt(len(ids)))
+            centroids = _spherical_kmeans(vectors, nlist, seed)
+            assign = _assign(vectors, centroids)
+            order = np.argsort(assign, kind="stable")
+            ids, vectors = ids[order], vectors[order]
+            bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+        index = cls(ids, vectors, embedder, centroids, bounds)
+        if path:
+            index._save(path, stamp)
+        return index
+
+    def _save(self, path: str, stamp: int) -> None:
+        """Write <path>.npy (vectors) and <path>.npz (the rest); readers never see half a file."""
+        tmp = f"{path}.{os.getpid()}.tmp.npy"
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=self.vectors.shape)
+        out[:] = self.vectors
+        out.flush()
+        del out
+        os.replace(tmp, path + ".npy")
+        meta = dict(ids=self.ids, stamp=np.int64(stamp))
+        meta.update({f"embedder_{key}": value for key, value in self.embedder.state().items()})
+        if self.centroids is not None:
+            meta.update(centroids=self.centroids, bounds=self.bounds)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        with open(tmp, "wb") as f:
+            np.savez(f, **meta)
+        os.replace(tmp, path + ".npz")
+        self.vectors = np.load(path + ".npy", mmap_mode="r")
+
+    @classmethod
+    def load(cls, path: str, stamp: int, embedder) -> Optional["SemanticIndex"]:
+        """The index saved at path, memory-mapped, or None if missing or built from other content."""
+        try:
+            with np.load(path + ".npz") as meta:
+                if int(meta["stamp"]) != stamp:
+                    return None
+                ids = meta["ids"]
+                embedder = embedder.load_state({key[len("embedder_"):]: meta[key] for key in meta.files
+                                                if key.startswith("embedder_")})
+                centroids = meta["centroids"] if "centroids" in meta else None
+                bounds = meta["bounds"] if "bounds" in meta else None
+            vectors = np.load(path + ".npy", mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return None
+        if vectors.shape != (len(ids), embedder.dim):
+            return None
+        return cls(ids, vectors, embedder, centroids, bounds)
+
+    def search(self, query: str, k: int, nprobe: int = NPROBE) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, cosine similarities) of the k nearest products, best first; ties by id."""
+        q = self.embedder.encode([query])[0]
+        if not q.any() or not len(self.ids):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if self.centroids is None:
+            rows = np.arange(len(self.ids))
+            sims = self.vectors @ q
+        else:
+            probe = np.argsort(-(self.centroids @ q), kind="stable")[:nprobe]
+            slices = [(self.bounds[l], self.bounds[l + 1]) for l in probe.tolist()]
+            rows = np.concatenate([np.arange(start, end) for start, end in slices])
+            sims = np.concatenate([self.vectors[start:end] @ q for start, end in slices])
+        if k < len(sims):
+            top = np.argpartition(-sims, k - 1)[:k]
+            rows, sims = rows[top], sims[top]
+        ids = self.ids[rows]
+        order = np.lexsort((ids, -sims))
+        return ids[order], sims[order]
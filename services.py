@@ -0,0 +1,131 @@
+import asyncio
+import atexit
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Coroutine, Iterator, Optional
+from google.adk.runners import Runner
+from google.adk.sessions import DatabaseSessionService
+from google.adk.memory import InMemoryMemoryService
+from agents import shopApp
+from productstore import async_store
+
+SESSION_DB_URL = "sqlite+aiosqlite:///shopgenie_sessions.db"
+
+
+class BackgroundLoop:
+    """
+    A long-lived asyncio event loop running on its own daemon thread.
+
+    Synchronous code (the Streamlit script threads) hands coroutines to it with submit(),
+    which is thread-safe, so connection pools and clients created on the loop are reused
+    by every caller instead of being tied to a throwaway loop.
+    """
+
+    def __init__(self, name: str = "shopgenie-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the loop from any thread; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Submit a coroutine and block the calling thread until it finishes."""
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, agen: AsyncIterator, timeout: Optional[float] = None) -> Iterator:
+        """
+        Drive an async generator on the loop and yield its items to the calling thread as
+        they are produced, bridged through a queue. Closing the iterator early cancels the
+        generator; an exception raised inside it is re-raised here.
+        """
+        items: queue.Queue = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            finally:
+                items.put(done)
+
+        future = self.submit(pump())
+        try:
+            while True:
+                item = items.get(timeout=timeout)
+                if item is done:
+                    break
+                yield item
+            future.result()
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def stop(self):
+        """Stop the loop, wait for its thread and close it."""
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+class AgentServices:
+    """
+    Process-wide agent runtime: one session service (and its engine/connection pool), one
+    memory service and one Runner, shared by every Streamlit session and rerun.
+
+    Everything runs on a single BackgroundLoop, so the async engine's connections (which
+    belong to the loop that opened them) and the model client's HTTP pool are reused across
+    turns and users, and concurrent turns interleave on the loop instead of queueing.
+    """
+
+    def __init__(self, db_url: str = SESSION_DB_URL):
+        self.background = BackgroundLoop()
+        self.session_service = DatabaseSessionService(db_url)
+        self.memory_service = InMemoryMemoryService()
+        self.runner = Runner(
+            app=shopApp,
+            session_service=self.session_service,
+            memory_service=self.memory_service
+        )
+        self._closed = False
+        self._close_lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    def submit(self, coro: Coroutine) -> Future:
+        if self._closed:
+            coro.close()
+            raise RuntimeError("Agent services have been shut down.")
+        return self.background.submit(coro)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the shared loop and wait for its result."""
+        return self.submit(coro).result(timeout)
+
+    def stream(self, agen: AsyncIterator, timeout: Optional[float] = None) -> Iterator:
+        """Iterate an async generator running on the shared loop from synchronous code."""
+        if self._closed:
+            raise RuntimeError("Agent services have been shut down.")
+        return self.background.iterate(agen, timeout)
+
+    def shutdown(self):
+        """Close the runner and dispose of the session and store engines, then stop the loop."""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                self.background.run(self.runner.close())
+                self.background.run(self.session_service.close())
+                self.background.run(async_store.close())
+            except Exception as e:
+                print(f"Error shutting down agent services: {e}")
+            finally:
+                self.background.stop()
@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# productstore opens sqlite:///shopgenie.db relative to the working directory when it is
+# imported; run from a scratch directory so the module-level store is a fresh seeded copy
+os.chdir(tempfile.mkdtemp(prefix="shopgenie-tests-"))
+
+from productstore import SEED_PRODUCTS, SQLProductStore  # noqa: E402
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'test.db'}"
+
+
+@pytest.fixture
+def seeded_store(db_url):
+    store = SQLProductStore(db_url, seed_data=SEED_PRODUCTS)
+    yield store
+    store.engine.dispose()
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import asynctools
+
+
+def _ticks_while(coro_factory, blocking_seconds: float = 0.3) -> int:
+    """Event loop ticks a concurrent task gets in while coro_factory() runs."""
+    async def main():
+        ticks = 0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not done.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        await coro_factory()
+        done.set()
+        await task
+        return ticks
+
+    return asyncio.run(main())
+
+
+def _slow(result):
+    def lookup(*args):
+        time.sleep(0.3)  # stands in for a catalog index rebuild
+        return result
+    return lookup
+
+
+def test_place_order_name_lookup_does_not_block_the_loop(monkeypatch):
+    monkeypatch.setattr(asynctools, "get_product_id_by_name",
+                        _slow({"status": "error", "error_message": "No product found matching 'x'."}))
+    assert _ticks_while(lambda: asynctools.place_order_with_user("x")) >= 10
+
+
+def test_cart_resolution_does_not_block_the_loop(monkeypatch):
+    monkeypatch.setattr(asynctools, "resolve_cart",
+                        _slow({"status": "error", "error_message": "No product found matching 'x'."}))
+    assert _ticks_while(lambda: asynctools.place_cart_order([{"product_name": "x"}])) >= 10
+
+
+def test_sync_and_async_tools_return_the_same_responses(seeded_store, db_url, monkeypatch):
+    import tools
+    from productstore import AsyncSQLProductStore
+
+    async_store = AsyncSQLProductStore(seeded_store, db_url.replace("sqlite://", "sqlite+aiosqlite://"))
+    monkeypatch.setattr(tools, "store", seeded_store)
+    monkeypatch.setattr(asynctools, "async_store", async_store)
+    placed = tools.place_order_with_user("Samsung Galaxy M14", 1)
+    assert placed["status"] == "success", placed
+    order_id = placed["data"]["order"]["order_id"]
+    returned = tools.return_order(order_id, "damaged")
+    assert returned["status"] == "success", returned
+    calls = [
+        ("check_order_status", (order_id,)),
+        ("check_order_status", (10_000,)),
+        ("get_my_orders", (5,)),
+        ("check_return_status", (returned["data"]["return"]["return_id"],)),
+        ("get_user_return_history", ()),
+        ("place_order_with_user", ("no such product", 1)),
+        ("place_order_with_user", ("Samsung Galaxy M14", 1_000)),
+        ("place_order_with_user", ("Samsung Galaxy M14", 0)),
+    ]
+
+    async def run_async():
+        try:
+            return [await getattr(asynctools, name)(*args) for name, args in calls]
+        finally:
+            await async_store.close()
+
+    assert asyncio.run(run_async()) == [getattr(tools, name)(*args) for name, args in calls]
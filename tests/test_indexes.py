@@ -0,0 +1,52 @@
+import random
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select, text
+
+from baseClass import Base, Order, OrderReturn, OrderStatus, Product, ReturnStatus, User
+from productstore import SEED_PRODUCTS, SQLProductStore
+
+HOT_QUERIES = [
+    ("order history", select(Order).where(Order.user_id == "user7").order_by(Order.order_id.desc()).limit(10),
+     "ix_orders_user_id_order_id"),
+    ("return count", select(func.count()).select_from(OrderReturn).join(Order).where(Order.user_id == "user7"),
+     "ix_order_returns_order_id"),
+    ("category + price", select(Product).where(Product.category == "laptops", Product.price <= 50000),
+     "ix_products_category_price"),
+    ("brand", select(Product).where(Product.brand == "samsung"), "ix_products_brand"),
+]
+
+
+@pytest.fixture
+def upgraded_store(db_url):
+    """A database file made before the indexes existed, with some orders, opened by the current store."""
+    engine = create_engine(db_url)
+    Base.metadata.create_all(engine)
+    rnd = random.Random(0)
+    with engine.begin() as conn:
+        for _, _, index in HOT_QUERIES:
+            conn.execute(text(f"DROP INDEX {index}"))
+        conn.execute(insert(Product), [{**p, "features": None} for p in SEED_PRODUCTS])
+        conn.execute(insert(User), [{"user_id": f"user{u}"} for u in range(50)])
+        conn.execute(insert(Order), [{
+            "user_id": f"user{rnd.randrange(50)}", "product_id": rnd.randint(1, len(SEED_PRODUCTS)),
+            "quantity": 1, "total_price": 100.0, "status": OrderStatus.CONFIRMED,
+        } for _ in range(2000)])
+        conn.execute(insert(OrderReturn), [{
+            "order_id": rnd.randint(1, 2000), "reason": "damaged", "status": ReturnStatus.REQUESTED,
+            "refund_amount": 100.0,
+        } for _ in range(100)])
+    engine.dispose()
+    store = SQLProductStore(db_url)
+    yield store
+    store.engine.dispose()
+
+
+@pytest.mark.parametrize("label, query, index", HOT_QUERIES, ids=[q[0] for q in HOT_QUERIES])
+def test_hot_queries_use_their_indexes(upgraded_store, label, query, index):
+    sql = str(query.compile(upgraded_store.engine, compile_kwargs={"literal_binds": True}))
+    with upgraded_store.engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    assert any(index in step for step in plan), f"{label} does not use {index}: {plan}"
+    assert not any("TEMP B-TREE" in step for step in plan), f"{label} sorts in a temp b-tree: {plan}"
@@ -0,0 +1,131 @@
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+from sqlalchemy import func, select
+
+from baseClass import Order, Product
+from catalogindex import CatalogIndex
+from productstore import SEED_PRODUCTS, AsyncSQLProductStore, SQLProductStore
+
+THREADS = 8
+# Other failures (e.g. a busy database) a buyer retries before the race fails
+MAX_RETRIES = 5
+
+
+def _race(place):
+    """THREADS buyers call place(user_id) until it reports a stock shortfall; returns the successful results."""
+    placed = [[] for _ in range(THREADS)]
+    errors = []
+
+    def buyer(i):
+        retries = 0
+        while True:
+            result = place(f"user{i}")
+            if result["ok"]:
+                placed[i].append(result)
+            elif "left in stock" in result["message"]:
+                return
+            elif retries == MAX_RETRIES:
+                errors.append(result["message"])
+                return
+            else:
+                retries += 1
+
+    workers = [threading.Thread(target=buyer, args=(i,)) for i in range(THREADS)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    assert not errors, errors
+    return [r for results in placed for r in results]
+
+
+def _stock_and_units(store, pid):
+    with store.engine.connect() as conn:
+        stock = conn.scalar(select(Product.stock).where(Product.id == pid))
+        units = conn.scalar(select(func.coalesce(func.sum(Order.quantity), 0)).where(Order.product_id == pid))
+        orders = conn.scalar(select(func.count()).select_from(Order).where(Order.product_id == pid))
+    return stock, units, orders
+
+
+@pytest.mark.parametrize("qty", [0, -5])
+def test_place_order_rejects_non_positive_quantities(seeded_store, db_url, qty):
+    pid = SEED_PRODUCTS[0]["id"]
+    rejected = {"ok": False, "message": "Quantity must be at least 1."}
+    before = _stock_and_units(seeded_store, pid)
+    assert seeded_store.place_order("user0", pid, qty) == rejected
+    async_store = AsyncSQLProductStore(seeded_store, db_url.replace("sqlite://", "sqlite+aiosqlite://"))
+
+    async def place_async():
+        try:
+            return await async_store.place_order("user0", pid, qty)
+        finally:
+            await async_store.close()
+
+    assert asyncio.run(place_async()) == rejected
+    assert _stock_and_units(seeded_store, pid) == before
+
+
+def test_concurrent_place_order_never_oversells(db_url):
+    stock, qty = 100, 3
+    product = {**SEED_PRODUCTS[0], "stock": stock}
+    store = SQLProductStore(db_url, seed_data=[product])
+    try:
+        placed = _race(lambda user: store.place_order(user, product["id"], qty))
+        final_stock, units, orders = _stock_and_units(store, product["id"])
+    finally:
+        store.engine.dispose()
+    assert final_stock >= 0
+    assert final_stock == stock % qty
+    assert orders == len(placed) == stock // qty
+    assert orders * qty == units == stock - final_stock
+
+
+def test_concurrent_bulk_checkout_never_oversells(db_url):
+    stocks = {SEED_PRODUCTS[0]["id"]: 50, SEED_PRODUCTS[1]["id"]: 31}
+    cart = [(SEED_PRODUCTS[0]["id"], 2), (SEED_PRODUCTS[1]["id"], 1)]
+    store = SQLProductStore(db_url, seed_data=[{**p, "stock": stocks[p["id"]]} for p in SEED_PRODUCTS[:2]])
+    try:
+        placed = _race(lambda user: store.place_orders_bulk(user, cart))
+        after = {pid: _stock_and_units(store, pid) for pid in stocks}
+    finally:
+        store.engine.dispose()
+    # The first line runs out after 25 carts; every cart placed both of its orders or neither
+    assert len(placed) == 25
+    assert all(len(r["orders"]) == len(cart) for r in placed)
+    for pid, qty in cart:
+        final_stock, units, orders = after[pid]
+        assert final_stock >= 0
+        assert orders == len(placed)
+        assert orders * qty == units == stocks[pid] - final_stock
+
+
+def test_concurrent_orders_leave_the_index_stock_current(db_url, monkeypatch):
+    stocks = {SEED_PRODUCTS[0]["id"]: 60, SEED_PRODUCTS[1]["id"]: 60}
+    store = SQLProductStore(db_url, seed_data=[{**p, "stock": stocks[p["id"]]} for p in SEED_PRODUCTS[:2]])
+    update_stock = CatalogIndex.update_stock
+    rnd = random.Random(0)
+
+    def delayed_update_stock(index, stock, version):
+        # Widen the gap between a commit and its patch, where out-of-order patches would show
+        time.sleep(rnd.random() * 0.002)
+        return update_stock(index, stock, version)
+
+    monkeypatch.setattr(CatalogIndex, "update_stock", delayed_update_stock)
+    single = SEED_PRODUCTS[0]["id"]
+    cart = [(SEED_PRODUCTS[0]["id"], 1), (SEED_PRODUCTS[1]["id"], 2)]
+    try:
+        store.catalog_index()
+        placed = _race(lambda user: store.place_order(user, single, 1) if rnd.random() < 0.5
+                       else store.place_orders_bulk(user, cart))
+        index = store.current_catalog_index()
+        after = {pid: _stock_and_units(store, pid)[0] for pid in stocks}
+    finally:
+        store.engine.dispose()
+    assert placed
+    # Patched in place throughout, never left stale for a rebuild to paper over
+    assert index is not None
+    assert {pid: index.stock[index.position(pid)] for pid in stocks} == after
@@ -0,0 +1,86 @@
+import asyncio
+import contextlib
+
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from baseClass import Order, OrderReturn, OrderStatus, Product, ReturnStatus, User
+from productstore import SEED_PRODUCTS, AsyncSQLProductStore
+
+USER = "tester"
+
+
+@contextlib.contextmanager
+def count_statements(engine):
+    """Count the SQL statements an engine (sync or async) executes inside the block."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    counter = {"n": 0}
+
+    def count(*args):
+        counter["n"] += 1
+
+    event.listen(sync_engine, "before_cursor_execute", count)
+    try:
+        yield counter
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count)
+
+
+@pytest.fixture
+def stores(seeded_store, db_url):
+    with seeded_store.engine.begin() as conn:
+        conn.execute(insert(User), [{"user_id": USER}])
+        # Every order on a different product, so lazy loading could not hit the identity map
+        conn.execute(insert(Order), [{
+            "user_id": USER, "product_id": p["id"], "quantity": 1, "total_price": p["price"],
+            "status": OrderStatus.CONFIRMED,
+        } for p in SEED_PRODUCTS])
+        conn.execute(insert(OrderReturn), [{
+            "order_id": 1, "reason": "damaged", "status": ReturnStatus.REQUESTED, "refund_amount": 1.0,
+        }])
+    async_store = AsyncSQLProductStore(seeded_store, db_url.replace("sqlite://", "sqlite+aiosqlite://"))
+    yield seeded_store, async_store
+    asyncio.run(async_store.close())
+
+
+def _sync_count(store, fn):
+    with count_statements(store.engine) as counter:
+        result = fn()
+    return counter["n"], result
+
+
+def _async_count(async_store, coro_fn):
+    with count_statements(async_store.engine) as counter:
+        result = asyncio.run(coro_fn())
+    return counter["n"], result
+
+
+@pytest.mark.parametrize("limit", [1, 5, len(SEED_PRODUCTS)])
+def test_get_user_orders_is_one_statement(stores, limit):
+    store, async_store = stores
+    n, orders = _sync_count(store, lambda: store.get_user_orders(USER, limit))
+    assert n == 1
+    assert len(orders) == limit and all(o["product_name"] for o in orders)
+    n, async_orders = _async_count(async_store, lambda: async_store.get_user_orders(USER, limit))
+    assert n == 1
+    assert async_orders == orders
+
+
+@pytest.mark.parametrize("method, arg", [("get_order", 1), ("get_return_status", 1)])
+def test_order_and_return_lookups_are_one_statement(stores, method, arg):
+    store, async_store = stores
+    n, result = _sync_count(store, lambda: getattr(store, method)(USER, arg))
+    assert n == 1
+    assert result["ok"], result
+    n, async_result = _async_count(async_store, lambda: getattr(async_store, method)(USER, arg))
+    assert n == 1
+    assert async_result == result
+
+
+def test_product_to_dict_loads_feature_tags_in_one_select(seeded_store):
+    with count_statements(seeded_store.engine) as counter, Session(seeded_store.engine) as ses:
+        products = [p.to_dict() for p in ses.query(Product).all()]
+    # The products, then every product's tags in one SELECT ... IN, however many products
+    assert counter["n"] == 2
+    assert [p["features"] for p in products] == [p["features"] for p in SEED_PRODUCTS]
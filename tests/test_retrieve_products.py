@@ -0,0 +1,78 @@
+import pytest
+
+import tools
+from productstore import store
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    tools.products_cache.clear()
+    yield
+    tools.products_cache.clear()
+
+
+def _both_paths(**kwargs):
+    """retrieve_products over the resident index, then over the SQL push-down (index made stale)."""
+    store.catalog_index()
+    assert store.current_catalog_index() is not None
+    indexed = tools.retrieve_products(detailed=True, **kwargs)
+    store._bump_catalog_version()
+    assert store.current_catalog_index() is None
+    pushed_down = tools.retrieve_products(detailed=True, **kwargs)
+    return indexed, pushed_down
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"features": "5g"},
+    {"features": ["5g"]},
+    {"features": "wireless", "max_price": 20000},
+    {"category": "laptops", "features": "gaming"},
+    {"query": "cushioned breathable", "semantic": True},
+])
+def test_index_and_sql_paths_agree(kwargs):
+    indexed, pushed_down = _both_paths(**kwargs)
+    assert indexed["status"] == "success", indexed
+    assert pushed_down == indexed
+
+
+def test_bare_string_feature_is_one_feature():
+    as_string = tools.retrieve_products(features="5g")
+    as_list = tools.retrieve_products(features=["5g"])
+    assert as_string == as_list
+    assert as_string["data"]["total_found"] > 0
+    assert all("5g" in p["features"] for p in as_string["data"]["products"])
+
+
+def test_query_mode_reports_whether_total_found_is_capped():
+    result = tools.retrieve_products(query="galaxy")
+    assert result["status"] == "success"
+    assert result["data"]["total_found"] == 2
+    assert result["data"]["total_found_capped"] is False
+
+
+def test_query_mode_candidates_are_capped(monkeypatch):
+    monkeypatch.setattr(tools, "FTS_CANDIDATES", 1)
+    result = tools.retrieve_products(query="galaxy")
+    assert result["data"]["total_found"] == 1
+    assert result["data"]["total_found_capped"] is True
+
+
+def test_semantic_mode_finds_a_category_by_its_catalog_vocabulary():
+    result = tools.retrieve_products(query="cushioned breathable", semantic=True)
+    products = result["data"]["products"]
+    assert products and all(p["category"] == "running shoes" for p in products)
+    assert result["data"]["total_found_capped"] is False
+
+
+@pytest.mark.parametrize("query, names", [
+    ("galxy", {"Samsung Galaxy M14", "Samsung Galaxy Watch 5"}),
+    ("samsnug", {"Samsung Galaxy M14", "Samsung Galaxy Watch 5"}),
+    ("logitek", {"Logitech MX Master 3S"}),
+    ("ultrabost", {"Adidas Ultraboost 22"}),
+    ("inspirn", {"Dell Inspiron 15"}),
+])
+def test_query_mode_finds_misspelt_words(query, names):
+    indexed, pushed_down = _both_paths(query=query)
+    assert pushed_down == indexed
+    assert {p["name"] for p in indexed["data"]["products"]} == names
+    assert indexed["data"]["total_found"] == len(names)
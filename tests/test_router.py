@@ -0,0 +1,44 @@
+import pytest
+
+import router
+
+
+@pytest.mark.parametrize("query, args", [
+    ("i want running shoes", {"category": "running shoes"}),
+    ("show me running shoes", {"category": "running shoes"}),
+    ("running shoe", {"category": "running shoes"}),
+    ("find a smart watch", {"category": "wearables"}),
+    ("smartphones under 15000", {"category": "smartphones", "max_price": 15000}),
+    ("show me nike running shoes", {"category": "running shoes", "brand": "nike"}),
+    ("i need a gaming laptop", {"category": "laptops", "features": ["gaming"]}),
+    ("show laptops", {"category": "laptops"}),
+])
+def test_plain_catalog_searches_take_the_fast_path(query, args):
+    r = router.route(query)
+    assert r["tool"] == "retrieve_products"
+    assert r["args"] == args
+    assert r["confidence"] >= router.MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("query", [
+    "compare running shoes and laptops for travel",
+    "which running shoes are best for a marathon",
+    "return my running shoes",
+])
+def test_searches_with_unexplained_words_go_to_the_llm(query):
+    r = router.route(query)
+    assert r is None or r["confidence"] < router.MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("query, tool, args", [
+    ("show my orders", "get_my_orders", {}),
+    ("my last 3 orders", "get_my_orders", {"limit": 3}),
+    ("what is the status of order 12?", "check_order_status", {"order_id": 12}),
+    ("check return #4 status", "check_return_status", {"return_id": 4}),
+])
+def test_order_and_return_lookups(query, tool, args):
+    assert router.route(query) == {"tool": tool, "args": args, "confidence": 1.0}
+
+
+def test_unrelated_requests_are_not_routed():
+    assert router.route("tell me a joke") is None
@@ -0,0 +1,45 @@
+import numpy as np
+
+import semanticindex
+from productstore import SEED_PRODUCTS
+from semanticindex import HashingEmbedder, SemanticIndex, load_embedder
+
+IDS = [p["id"] for p in SEED_PRODUCTS]
+TEXTS = [" ".join([p["name"], p["brand"], p["category"], *p["features"]]) for p in SEED_PRODUCTS]
+LABELS = [p["category"] for p in SEED_PRODUCTS]
+CATEGORY = dict(zip(IDS, LABELS))
+
+
+def test_concepts_are_learned_from_catalog_categories():
+    embedder, _ = HashingEmbedder().fit(TEXTS, LABELS)
+    # Tags shared by several running shoes, and nothing learned without labels
+    assert "cushioned" in embedder.expansions and "breathable" in embedder.expansions
+    assert HashingEmbedder().fit(TEXTS)[0].expansions == {}
+
+
+def test_query_in_catalog_vocabulary_finds_its_category():
+    index = SemanticIndex.build(IDS, TEXTS, LABELS)
+    ids, sims = index.search("cushioned breathable", 3)
+    assert [CATEGORY[i] for i in ids.tolist()] == ["running shoes"] * 3
+    assert np.all(np.diff(sims) <= 0)
+    # Request filler alone has no features to match
+    assert len(index.search("something for me", 3)[0]) == 0
+
+
+def test_saved_index_is_reused_until_the_catalog_changes(tmp_path):
+    path = str(tmp_path / "catalog.vectors")
+    built = SemanticIndex.build(IDS, TEXTS, LABELS, path=path)
+    loaded = SemanticIndex.load(path, semanticindex.fingerprint(IDS, TEXTS, LABELS, HashingEmbedder()),
+                                HashingEmbedder())
+    assert isinstance(loaded.vectors, np.memmap)
+    assert loaded.embedder.expansions == built.embedder.expansions
+    assert np.array_equal(loaded.embedder.encode(["cushioned"]), built.embedder.encode(["cushioned"]))
+    relabelled = ["misc"] + LABELS[1:]
+    assert SemanticIndex.load(path, semanticindex.fingerprint(IDS, TEXTS, relabelled, HashingEmbedder()),
+                              HashingEmbedder()) is None
+
+
+def test_missing_embedding_model_falls_back_to_hashing(monkeypatch, tmp_path):
+    monkeypatch.setenv(semanticindex.EMBEDDING_MODEL_ENV, str(tmp_path / "no-such-model"))
+    assert isinstance(load_embedder(), HashingEmbedder)
+
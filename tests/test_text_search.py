@@ -0,0 +1,31 @@
+from productstore import SEED_PRODUCTS, SQLProductStore, fts_match
+
+
+def test_match_tiers_go_from_every_word_to_any_trigram():
+    assert fts_match("Galaxy watch") == [
+        '"galaxy" AND "watch"',
+        '"galaxy" OR "watch"',
+        '"gal" OR "ala" OR "lax" OR "axy" OR "wat" OR "atc" OR "tch"',
+    ]
+    assert fts_match("nike") == ['"nike"', '"nik" OR "ike"']
+    assert fts_match("tv 4k") == []
+
+
+def test_text_search_uses_the_strictest_tier_that_matches(seeded_store):
+    ids, matches = seeded_store.text_search("galaxy watch", 10)
+    assert ids == [11] and matches == 1
+    # "galxy" matches no product as a word; the trigram tier still finds both Galaxy products
+    ids, matches = seeded_store.text_search("galxy", 10)
+    assert sorted(ids) == [2, 11] and matches == 2
+    assert seeded_store.text_search("zzzz", 10) == ([], 0)
+
+
+def test_text_search_counts_matches_beyond_the_limit(db_url):
+    catalog = [{**SEED_PRODUCTS[1], "id": i, "name": f"Samsung Galaxy M{i}"} for i in range(1, 251)]
+    store = SQLProductStore(db_url, seed_data=catalog)
+    try:
+        ids, matches = store.text_search("galaxy", 200)
+    finally:
+        store.engine.dispose()
+    assert len(ids) == 200
+    assert matches == 250
@@ -1,173 +1,179 @@
 import asyncio
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional
 from productstore import store
-import re
+from querycache import QueryCache
+import intentparser
 from google.adk.tools import BaseTool
 from google.adk.tools.tool_context import ToolContext
 import os
 import base64
+import functools
 from productstore import Session, Product, Order
 from sqlalchemy.exc import SQLAlchemyError
-from rapidfuzz import fuzz
 # from fuzzywuzzy import process
 
+# Results of retrieve_products keyed on the normalized arguments; cleared whenever the
+# catalog version moves (any product write, including stock changes from orders)
+products_cache = QueryCache(maxsize=256, ttl=300)
+
+# Fields returned per product unless detailed=True; enough for the agent to name, price,
+# compare and link products without shipping scoring internals to the model
+LEAN_PRODUCT_FIELDS = ("id", "name", "brand", "category", "color", "price_formatted", "rating", "stock", "features")
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+# Products the full-text stage hands to the scoring formula in query mode
+FTS_CANDIDATES = 200
+# Nearest neighbours the embedding stage hands to the scoring formula in semantic mode
+SEMANTIC_CANDIDATES = 200
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        kind, value = base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)
+        if kind != "offset":
+            raise ValueError
+        return max(0, int(value))
+    except Exception:
+        raise ValueError(f"Invalid cursor '{cursor}'.")
+
+def run_in_thread(tool):
+    """
+    Async wrapper that runs a blocking tool on the default thread pool. ADK dispatches the
+    function calls of one model response concurrently, but a plain sync tool runs inline and
+    blocks the event loop until it returns; wrapped, calls issued together overlap. The
+    wrapper keeps the tool's name, signature and docstring, so its declaration is unchanged.
+    """
+    @functools.wraps(tool)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(tool, *args, **kwargs)
+    return wrapper
+
+def _products_cache_key(name, category, max_price, brand, color, features, offset, limit, detailed, query,
+                        semantic) -> tuple:
+    lower = lambda v: v.lower() if v else None
+    return (lower(name), lower(category), max_price or None, lower(brand), lower(color),
+            tuple(sorted(features)), offset, limit, bool(detailed), lower(query), bool(semantic))
+
 def retrieve_products(
     name: str = None,
     category: str = None,
     max_price: int = None,
     brand: str = None,
     color: str = None,
-    features: list = None
+    features: list = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    offset: int = 0,
+    cursor: str = None,
+    detailed: bool = False,
+    query: str = None,
+    semantic: bool = False
 ) -> Dict[str, Any]:
+    """Search the catalog and return one page of the best matching products.
+
+    Results are ranked best first. `limit` sets the page size (max 50) and `offset` the
+    number of results to skip; alternatively pass the `next_cursor` from a previous
+    response as `cursor` to get the next page. Set `detailed` to include every stored
+    column and the scoring internals instead of the lean product summary.
+
+    `query` is a free-text search over product names, brands and features that tolerates
+    partial and misspelt words; the other filters still apply to what it finds. Pass
+    either `name` or `query`, not both. Set `semantic` to match the query by meaning
+    instead of spelling ("cushioned breathable" finds running shoes). A query only ranks
+    its best text matches; `total_found_capped` is then true and `total_found` counts
+    those, not every product that mentions the words.
+    """
     try:
         if features is None:
             features = []
-
-        products = store.list_products()
-
-        # Fuzzy search for name
-        if name:
-            name_lower = name.lower()
-            filtered_products = []
-            for p in products:
-                product_name = p.get("name", "").lower()
-                # Use fuzzy matching with threshold of 60
-                similarity = fuzz.partial_ratio(name_lower, product_name)
-                if similarity >= 60:
-                    p["_name_similarity"] = similarity
-                    filtered_products.append(p)
-            products = filtered_products
-        
-        # Fuzzy search for category
-        if category:
-            category_lower = category.lower()
-            filtered_products = []
-            for p in products:
-                product_category = p.get("category", "").lower()
-                similarity = fuzz.ratio(category_lower, product_category)
-                if similarity >= 70:
-                    p["_category_similarity"] = similarity
-                    filtered_products.append(p)
-            products = filtered_products
-        
-        # Exact filters for price, brand, color
-        if max_price:
-            products = [p for p in products if p["price"] <= max_price]
-        
-        # Fuzzy search for brand
-        if brand:
-            brand_lower = brand.lower()
-            filtered_products = []
-            for p in products:
-                product_brand = p.get("brand", "").lower()
-                similarity = fuzz.ratio(brand_lower, product_brand)
-                if similarity >= 70:
-                    p["_brand_similarity"] = similarity
-                    filtered_products.append(p)
-            products = filtered_products
-        
-        # Fuzzy search for color
-        if color:
-            color_lower = color.lower()
-            filtered_products = []
-            for p in products:
-                product_color = p.get("color", "").lower()
-                similarity = fuzz.ratio(color_lower, product_color)
-                if similarity >= 70:
-                    p["_color_similarity"] = similarity
-                    filtered_products.append(p)
-            products = filtered_products
-        
-        # Features matching (keep as is, since features are tags)
-        if features:
-            products = [p for p in products if any(f in p["features"] for f in features)]
-
-        # Scoring system
-        for p in products:
-            score = p["rating"] * 20
-            
-            # Add fuzzy match bonuses
-            score += p.get("_name_similarity", 0) * 0.5
-            score += p.get("_category_similarity", 0) * 0.3
-            score += p.get("_brand_similarity", 0) * 0.2
-            score += p.get("_color_similarity", 0) * 0.1
-            
-            score += sum(10 for f in features if f in p["features"])
-            if p["stock"] == 0:
-                score -= 50
-            elif p["stock"] < 3:
-                score -= 20
-            p["_score"] = score
-
-        products.sort(key=lambda x: x["_score"], reverse=True)
-        
-        # Format prices with Rs. prefix
-        for p in products:
+        elif isinstance(features, str):
+            # A single feature often arrives as a bare string; both search paths expect a list
+            features = [features]
+        if name and query:
+            return {"status": "error", "error_message": "Pass either name or query, not both."}
+        if semantic and not query:
+            return {"status": "error", "error_message": "semantic needs a query."}
+        if query and not semantic and not store.full_text:
+            # Without the FTS5 index a free-text query falls back to the fuzzy name filter
+            name, query = query, None
+        if cursor:
+            offset = _decode_cursor(cursor)
+        offset = max(0, offset or 0)
+        limit = min(max(1, limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+
+        version = store.catalog_version
+        products_cache.sync(version)
+        cache_key = _products_cache_key(name, category, max_price, brand, color, features, offset, limit, detailed, query,
+                                        semantic)
+        cached = products_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        search = dict(name=name, category=category, max_price=max_price,
+                      brand=brand, color=color, features=features, k=offset + limit)
+        capped = False
+        if semantic:
+            # First stage: the nearest products in embedding space, their similarity scored as is
+            scores = store.semantic_search(query, SEMANTIC_CANDIDATES)
+            search.update(candidates=list(scores), candidate_scores=scores)
+            capped = len(scores) >= SEMANTIC_CANDIDATES
+        elif query:
+            # First stage: the FTS5 index picks the bm25-best candidates for the scoring formula
+            candidates, matches = store.text_search(query, FTS_CANDIDATES)
+            search.update(query=query, candidates=candidates)
+            capped = matches > len(candidates)
+        index = store.current_catalog_index()
+        if index is not None:
+            # Filter and score over the resident catalog index in one vectorized batch; only
+            # the requested page is selected (partial selection) and turned into dicts
+            positions, sims, scores, total_found = index.search(**search)
+            ranked = []
+            for i in range(offset, len(positions)):
+                p = index.materialize(int(positions[i]))
+                for key, sim in sims.items():
+                    p[key] = float(sim[i])
+                p["_score"] = float(scores[i])
+                ranked.append(p)
+        else:
+            # The catalog changed since the index was built: answer in SQL rather than rebuild
+            # it from the whole table on this request (the next catalog_index() call does that)
+            ranked, total_found = store.search_products(**search)
+            ranked = ranked[offset:]
+        products = []
+        for p in ranked:
+            # Format prices with Rs. prefix
             p["price_formatted"] = f"Rs. {p['price']}"
+            if not detailed:
+                p = {field: p[field] for field in LEAN_PRODUCT_FIELDS}
+            products.append(p)
 
-        return {
+        has_more = offset + len(products) < total_found
+        result = {
             "status": "success",
             "data": {
                 "products": products,
-                "total_found": len(products)
+                "total_found": total_found,
+                "total_found_capped": capped,
+                "offset": offset,
+                "limit": limit,
+                "has_more": has_more,
+                "next_cursor": _encode_cursor(offset + len(products)) if has_more else None
             }
         }
+        # Only cache what was computed against the version the cache is synced to
+        if (index.version if index is not None else store.catalog_version) == version:
+            products_cache.put(cache_key, result)
+        return result
 
     except Exception as e:
         return {"status": "error", "error_message": str(e)}
 
 def parse_intent(query: str) -> Dict[str, Any]:
     try:
-        q = query.lower()
-        intent = {"category": None, "max_price": None, "brand": None,
-                  "color": None, "features": []}
-
-        # Fuzzy matching for common categories
-        categories_map = {
-            "running shoes": ["shoe", "shoes", "sneaker", "sneakers", "footwear"],
-            "smartphones": ["phone", "smartphone", "mobile", "cell"],
-            "laptops": ["laptop", "notebook", "computer"],
-            "earphones": ["earphone", "earbud", "earbuds", "headset"],
-            "headphones": ["headphone", "headphones"],
-            "tablets": ["tablet", "ipad"],
-            "cameras": ["camera", "dslr"],
-            "wearables": ["watch", "smartwatch", "wearable"]
-        }
-        
-        for category, keywords in categories_map.items():
-            for keyword in keywords:
-                if keyword in q:
-                    intent["category"] = category
-                    break
-            if intent["category"]:
-                break
-
-        m = re.search(r"under (\d+)", q)
-        if m:
-            intent["max_price"] = int(m.group(1))
-
-        # Fuzzy color matching
-        colors = ["black", "white", "blue", "red", "silver", "graphite", "gray", "aqua"]
-        for c in colors:
-            if c in q:
-                intent["color"] = c
-                break
-
-        # Fuzzy brand matching
-        brands = ["nike", "adidas", "samsung", "apple", "sony", "puma", "hp", "logitech", 
-                  "asus", "boat", "lenovo", "canon", "vivo", "dell"]
-        for b in brands:
-            if b in q:
-                intent["brand"] = b
-                break
-
-        # Feature extraction
-        features_keywords = ["cushioned", "lightweight", "battery", "camera", "noise-cancelling",
-                            "wireless", "gaming", "5g", "amoled", "fast charging"]
-        for f in features_keywords:
-            if f in q or f.replace("-", " ") in q:
-                intent["features"].append(f)
-
+        # One pass of a compiled keyword automaton over the normalized query; brands and colors
+        # come from the live catalog and results are memoized per query
+        intent = intentparser.parse(query, store.catalog_index())
         return {"status": "success", "data": {"intent": intent}}
 
     except Exception as e:
@@ -176,26 +182,18 @@ def parse_intent(query: str) -> Dict[str, Any]:
 def get_product_id_by_name(product_name: str) -> Dict[str, Any]:
     """Get product ID by searching for product name using fuzzy matching."""
     try:
-        products = store.list_products()
+        index = store.catalog_index()
         
-        if not products:
+        if not len(index):
             return {"status": "error", "error_message": "No products found in catalog."}
         
-        # Use fuzzy matching to find the best match
-        name_lower = product_name.lower()
-        best_match = None
-        best_score = 0
-        
-        for p in products:
-            product_name_lower = p.get("name", "").lower()
-            similarity = fuzz.partial_ratio(name_lower, product_name_lower)
-            
-            if similarity > best_score:
-                best_score = similarity
-                best_match = p
-        
+        # Use fuzzy matching to find the best match, scoring only rows the name index can't rule out
         # Require at least 60% similarity
-        if best_match and best_score >= 60:
+        match = index.name_index().best_match(product_name.lower(), cutoff=60)
+        
+        if match:
+            pos, best_score = match
+            best_match = index.materialize(pos)
             return {
                 "status": "success",
                 "data": {
@@ -213,6 +211,72 @@ def get_product_id_by_name(product_name: str) -> Dict[str, Any]:
         return {"status": "error", "error_message": str(e)}
 
 
+# Result shaping shared by these tools and their async versions in asynctools.py, which only
+# differ in how they reach the store
+
+def tool_error(e: Exception) -> Dict[str, Any]:
+    return {"status": "error", "error_message": str(e)}
+
+def tool_result(result: Dict[str, Any], data: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+    """The tool response for a store result ({"ok": ...}): data(result) on success, else the store's message."""
+    if result["ok"]:
+        return {"status": "success", "data": data(result)}
+    return {"status": "error", "error_message": result["message"]}
+
+def order_preflight(product_result: Dict[str, Any], quantity: int) -> Optional[Dict[str, Any]]:
+    """The error response if the product lookup failed or the product lacks the stock; None to go ahead."""
+    if product_result["status"] == "error":
+        return product_result
+    product_info = product_result["data"]
+    if product_info["stock"] < quantity:
+        return {
+            "status": "error",
+            "error_message": f"Insufficient stock. Only {product_info['stock']} units available for {product_info['product_name']}."
+        }
+    return None
+
+def _formatted_order(order: Dict[str, Any]) -> Dict[str, Any]:
+    order["total_price_formatted"] = f"Rs. {order.get('total_price', 0)}"
+    return order
+
+def order_data(result: Dict[str, Any], product_name: Optional[str] = None) -> Dict[str, Any]:
+    order = _formatted_order(result["order"])
+    if product_name is not None:
+        order["product_name"] = product_name
+    return {"order": order}
+
+def cart_data(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "orders": result["orders"],
+        "count": len(result["orders"]),
+        "total_price": result["total_price"],
+        "total_price_formatted": f"Rs. {result['total_price']}"
+    }
+
+def orders_response(orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"status": "success", "data": {"orders": [_formatted_order(o) for o in orders], "count": len(orders)}}
+
+def return_data(result: Dict[str, Any]) -> Dict[str, Any]:
+    refund_amount = result["refund_amount"]
+    return {
+        "return": result["return"],
+        "refund_amount": refund_amount,
+        "refund_amount_formatted": f"Rs. {refund_amount}"
+    }
+
+def return_status_data(result: Dict[str, Any]) -> Dict[str, Any]:
+    data = result["return"]
+    if "refund_amount" in data:
+        data["refund_amount_formatted"] = f"Rs. {data['refund_amount']}"
+    return {"return": data}
+
+def flag_data(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {"message": result["message"]}
+
+def return_history_data(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {"return_count": result["count"]}
+
+
 # def place_order(self, user_id: str, pid: int, qty: int) -> Dict[str, Any]:
 #     """
 #     Place an order for user_id. Returns {"ok": True, "order": {...}} on success,
@@ -251,110 +315,85 @@ def place_order_with_user(product_name: str, quantity: int = 1) -> Dict[str, Any
     try:
         # First, get the product ID by name
         product_result = get_product_id_by_name(product_name)
-        
-        if product_result["status"] == "error":
-            return product_result
-        
-        product_id = product_result["data"]["product_id"]
+        error = order_preflight(product_result, quantity)
+        if error:
+            return error
         product_info = product_result["data"]
         
-        # Check if sufficient stock
-        if product_info["stock"] < quantity:
-            return {
-                "status": "error", 
-                "error_message": f"Insufficient stock. Only {product_info['stock']} units available for {product_info['product_name']}."
-            }
-        
         # Place the order
-        result = store.place_order(user_id, product_id, quantity)
-        if result["ok"]:
-            order = result["order"]
-            order["total_price_formatted"] = f"Rs. {order.get('total_price', 0)}"
-            order["product_name"] = product_info["product_name"]
-            return {"status": "success", "data": {"order": order}}
-        return {"status": "error", "error_message": result["message"]}
+        result = store.place_order(user_id, product_info["product_id"], quantity)
+        return tool_result(result, lambda r: order_data(r, product_info["product_name"]))
     except Exception as e:
-        return {"status": "error", "error_message": str(e)}
+        return tool_error(e)
+
+def resolve_cart(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Map cart lines ({"product_name", "quantity"}) to (product_id, quantity) pairs against one
+    catalog index snapshot, matching each distinct name once. Cart checkout itself is the
+    async place_cart_order tool in asynctools.py.
+    """
+    index = store.catalog_index()
+    name_index = index.name_index()
+    matches = {}
+    lines = []
+    for item in items:
+        name = str(item.get("product_name", "")).strip()
+        key = name.lower()
+        if key not in matches:
+            matches[key] = name_index.best_match(key, cutoff=60) if key else None
+        if matches[key] is None:
+            return {"status": "error", "error_message": f"No product found matching '{name}'."}
+        pos, _ = matches[key]
+        lines.append((index.ids[pos], int(item.get("quantity", 1))))
+    return {"status": "success", "data": {"lines": lines}}
 
 def return_order(order_id: int, reason: str = None) -> Dict[str, Any]:
     """Request a return for an order."""
     user_id = "admin"  # Hardcoded user_id
     try:
-        result = store.request_return(user_id, order_id, reason)
-        if result["ok"]:
-            refund_amount = result["refund_amount"]
-            return {
-                "status": "success", 
-                "data": {
-                    "return": result["return"],
-                    "refund_amount": refund_amount,
-                    "refund_amount_formatted": f"Rs. {refund_amount}"
-                }
-            }
-        return {"status": "error", "error_message": result["message"]}
+        return tool_result(store.request_return(user_id, order_id, reason), return_data)
     except Exception as e:
-        return {"status": "error", "error_message": str(e)}
+        return tool_error(e)
 
 def check_order_status(order_id: int) -> Dict[str, Any]:
     """Check the status of a specific order."""
     user_id = "admin"  # Hardcoded user_id
     try:
-        result = store.get_order(user_id, order_id)
-        if result["ok"]:
-            order = result["order"]
-            order["total_price_formatted"] = f"Rs. {order.get('total_price', 0)}"
-            return {"status": "success", "data": {"order": order}}
-        return {"status": "error", "error_message": result["message"]}
+        return tool_result(store.get_order(user_id, order_id), order_data)
     except Exception as e:
-        return {"status": "error", "error_message": str(e)}
+        return tool_error(e)
 
 def get_my_orders(limit: int = 5) -> Dict[str, Any]:
     """Get recent orders for the current user."""
     user_id = "admin"  # Hardcoded user_id
     try:
-        orders = store.get_user_orders(user_id, limit)
-        for order in orders:
-            order["total_price_formatted"] = f"Rs. {order.get('total_price', 0)}"
-        return {"status": "success", "data": {"orders": orders, "count": len(orders)}}
+        return orders_response(store.get_user_orders(user_id, limit))
     except Exception as e:
-        return {"status": "error", "error_message": str(e)}
+        return tool_error(e)
 
 def check_return_status(return_id: int) -> Dict[str, Any]:
     """Check the status of a return request."""
     user_id = "admin"  # Hardcoded user_id
     try:
-        result = store.get_return_status(user_id, return_id)
-        if result["ok"]:
-            return_data = result["return"]
-            if "refund_amount" in return_data:
-                return_data["refund_amount_formatted"] = f"Rs. {return_data['refund_amount']}"
-            return {"status": "success", "data": {"return": return_data}}
-        return {"status": "error", "error_message": result["message"]}
+        return tool_result(store.get_return_status(user_id, return_id), return_status_data)
     except Exception as e:
-        return {"status": "error", "error_message": str(e)}
+        return tool_error(e)
 
 def flag_return_for_review(order_id: int, reason: str) -> Dict[str, Any]:
     """Flags a return request for manual review by a human agent."""
     user_id = "admin"  # Hardcoded user_id
     try:
-        result = store.flag_suspicious_return(user_id, order_id, reason)
-        if result["ok"]:
-            return {"status": "success", "data": {"message": result["message"]}}
-        return {"status": "error", "error_message": result["message"]}
+        return tool_result(store.flag_suspicious_return(user_id, order_id, reason), flag_data)
     except Exception as e:
-        return {"status": "error", "error_message": str(e)}
+        return tool_error(e)
 
 def get_user_return_history() -> Dict[str, Any]:
     """Gets the number of returns previously initiated by the current user."""
     user_id = "admin"  # Hardcoded user_id
     try:
-        result = store.get_user_return_count(user_id)
-        if result["ok"]:
-            return {"status": "success", "data": {"return_count": result["count"]}}
-        return {"status": "error", "error_message": result["message"]}
+        return tool_result(store.get_user_return_count(user_id), return_history_data)
     except Exception as e:
-        return {"status": "error", "error_message": str(e)}
-
+        return tool_error(e)
 
 # from google.adk.tools import BaseTool
 # from google.adk.tools.tool_context import ToolContext
@@ -3,6 +3,9 @@ import os
 from dotenv import load_dotenv
 from google.adk.runners import Runner
 from google.adk.sessions import DatabaseSessionService
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event
+from typing import AsyncIterator
 import json
 
 load_dotenv()
@@ -17,6 +20,16 @@ MODEL_NAME = os.getenv("MODEL_NAME")
 #  http_status_codes=[429, 500, 503, 504], # Retry on these HTTP errors
 #  )
 
+async def _open_session(runner_instance: Runner, session_name: str, session_service: DatabaseSessionService):
+    app_name = runner_instance.app_name
+    try:
+        return await session_service.create_session(
+            app_name=app_name, user_id=USER_ID, session_id=session_name)
+    except Exception:
+        return await session_service.get_session(
+            app_name=app_name, user_id=USER_ID, session_id=session_name)
+
+
 async def run_session(
     runner_instance: Runner,
     user_queries: list[str] | str = None,
@@ -24,13 +37,7 @@ async def run_session(
     session_service: DatabaseSessionService = None,
     ):
     print(f"\n ### Session: {session_name}")
-    app_name = runner_instance.app_name
-    try:
-        session = await session_service.create_session(
-        app_name=app_name, user_id=USER_ID, session_id=session_name)
-    except Exception as e:
-         session = await session_service.get_session(
-    app_name=app_name, user_id=USER_ID, session_id=session_name )
+    session = await _open_session(runner_instance, session_name, session_service)
     if user_queries:
         if type(user_queries) == str:
             user_queries = [user_queries]
@@ -48,6 +55,67 @@ async def run_session(
         print("No queries!")
 
 
+async def stream_session(
+    runner_instance: Runner,
+    user_query: str,
+    session_name: str = "default",
+    session_service: DatabaseSessionService = None,
+    ) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of run_session: yields the reply's text as it is generated.
+
+    The runner is driven in SSE mode, so the model's partial events arrive token chunk by
+    chunk and are yielded as they come. Like run_session, it stops at the first complete
+    (non-partial) text response; any tail of that response not already streamed is yielded
+    before returning.
+    """
+    print(f"\n ### Session: {session_name}")
+    session = await _open_session(runner_instance, session_name, session_service)
+    print(f"\nUser > {user_query}")
+    query = types.Content(role="user", parts=[types.Part(text=user_query)])
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE)
+    streamed = ""
+    async for event in runner_instance.run_async(
+        user_id=USER_ID, session_id=session.id, new_message=query, run_config=run_config):
+        if not (event.content and event.content.parts):
+            continue
+        text = event.content.parts[0].text
+        if not text or text == "None":
+            continue
+        if event.partial:
+            streamed += text
+            yield text
+            continue
+        # The final event carries the aggregated text of the partials that preceded it
+        if text.startswith(streamed):
+            if len(text) > len(streamed):
+                yield text[len(streamed):]
+        elif not streamed:
+            yield text
+        return
+
+
+async def record_exchange(
+    runner_instance: Runner,
+    user_query: str,
+    reply: str,
+    session_name: str = "default",
+    session_service: DatabaseSessionService = None,
+    ):
+    """
+    Append a turn answered outside the runner (the fast-path router) to the session, so the
+    orchestrator still sees it as conversation history on later turns.
+    """
+    session = await _open_session(runner_instance, session_name, session_service)
+    invocation_id = Event.new_id()
+    await session_service.append_event(session, Event(
+        invocation_id=invocation_id, author="user",
+        content=types.Content(role="user", parts=[types.Part(text=user_query)])))
+    await session_service.append_event(session, Event(
+        invocation_id=invocation_id, author=runner_instance.agent.name,
+        content=types.Content(role="model", parts=[types.Part(text=reply)])))
+
+
 async def auto_save(callback_context):
     try:
         session = callback_context.session